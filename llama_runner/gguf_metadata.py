@@ -1,7 +1,6 @@
 import os
 import json
 import logging
-import traceback # Import traceback
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from llama_runner.config_loader import CONFIG_DIR # Assuming CONFIG_DIR is defined here
@@ -29,15 +28,15 @@ try:
     logging.debug("Successfully imported GGUFReader and LlamaFileType.")
 except ImportError as e:
     # GGUFReader and LlamaFileType remain None as initialized above
-    logging.warning(f"ImportError: The 'gguf' library or required components are missing: {e}. Metadata extraction will be disabled.")
+    logging.warning("ImportError: The 'gguf' library or required components are missing: %s. Metadata extraction will be disabled.", e)
     GGUF_AVAILABLE = False
 except Exception as e:
     # GGUFReader and LlamaFileType remain None as initialized above
-    logging.warning(f"Error importing gguf components: {e}. Metadata extraction may be limited.")
+    logging.warning("Error importing gguf components: %s. Metadata extraction may be limited.", e)
     GGUF_AVAILABLE = False
 
 # --- Add debug logging for GGUF_AVAILABLE status ---
-logging.debug(f"GGUF_AVAILABLE status after import attempt: {GGUF_AVAILABLE}")
+logging.debug("GGUF_AVAILABLE status after import attempt: %s", GGUF_AVAILABLE)
 # --- End debug logging ---
 
 
@@ -47,7 +46,7 @@ Path(METADATA_CACHE_DIR).mkdir(parents=True, exist_ok=True)
 def ensure_cache_dir_exists():
     """Ensures the metadata cache directory exists."""
     Path(METADATA_CACHE_DIR).mkdir(parents=True, exist_ok=True)
-    logging.info(f"Ensured metadata cache directory exists: {METADATA_CACHE_DIR}")
+    logging.info("Ensured metadata cache directory exists: %s", METADATA_CACHE_DIR)
 
 # Renamed from calculate_file_hash to get_file_size
 def get_file_size(filepath: str) -> Optional[int]:
@@ -55,10 +54,10 @@ def get_file_size(filepath: str) -> Optional[int]:
     try:
         return os.path.getsize(filepath)
     except FileNotFoundError:
-        logging.error(f"File not found for size check: {filepath}")
+        logging.error("File not found for size check: %s", filepath)
         return None
     except Exception as e:
-        logging.error(f"Error getting size for {filepath}: {e}\n{traceback.format_exc()}")
+        logging.error("Error getting size for %s: %s", filepath, e, exc_info=True)
         return None
 
 # Updated to use file_size instead of file_hash
@@ -79,11 +78,11 @@ def load_metadata_from_cache(model_name: str, file_size: int) -> Optional[Dict[s
                 metadata = json.load(f)
             return metadata
         except json.JSONDecodeError as e:
-            logging.error(f"Error decoding JSON from cache file {cache_path}: {e}")
+            logging.error("Error decoding JSON from cache file %s: %s", cache_path, e)
             # In case of error, treat cache as invalid
             return None
         except Exception as e:
-            logging.error(f"Error loading metadata from cache {cache_path}: {e}")
+            logging.error("Error loading metadata from cache %s: %s", cache_path, e)
             return None
     return None
 
@@ -135,21 +134,21 @@ def save_metadata_to_cache(model_name: str, file_size: int, metadata: Dict[str,
         prepared_metadata = prepare_for_json(metadata)
         with open(cache_path, 'w') as f:
             json.dump(prepared_metadata, f, indent=2)
-        logging.info(f"Saved metadata to cache for {model_name} (size: {file_size}) at {cache_path}")
+        logging.info("Saved metadata to cache for %s (size: %s) at %s", model_name, file_size, cache_path)
     except Exception as e:
-        logging.error(f"Error saving metadata to cache {cache_path}: {e}")
+        logging.error("Error saving metadata to cache %s: %s", cache_path, e)
 
 def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Extracts relevant metadata from a GGUF file."""
     # --- Add debug logging at the start of the function ---
-    logging.debug(f"Attempting to extract GGUF metadata from: {model_path}")
+    logging.debug("Attempting to extract GGUF metadata from: %s", model_path)
     # --- End debug logging ---
 
     if not GGUF_AVAILABLE:
         logging.error("GGUF library not available. Cannot extract metadata.")
         return None
     if not os.path.exists(model_path):
-        logging.error(f"Model file not found for metadata extraction: {model_path}")
+        logging.error("Model file not found for metadata extraction: %s", model_path)
         return None
 
     if not GGUFReader: # Check if GGUFReader was successfully imported (it's initialized to None if import fails)
@@ -171,19 +170,19 @@ def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Opti
                 raw_metadata[key] = value # Store in raw_metadata
                 # Add detailed logging for extracted values, especially non-scalar ones
                 if isinstance(value, (list, tuple)):
-                     logging.debug(f"Extracted list/tuple metadata for key '{key}': Type={type(value)}, Length={len(value)}, Value={value}")
+                     logging.debug("Extracted list/tuple metadata for key '%s': Type=%s, Length=%s, Value=%s", key, type(value), len(value), value)
                 # Ensure np is not None before using its attributes
                 elif NUMPY_AVAILABLE and np is not None and isinstance(value, (np.ndarray, np.memmap)): # Explicit np is not None
-                     logging.debug(f"Extracted numpy array metadata for key '{key}': Type={type(value)}, Shape={value.shape}, Value={value}")
+                     logging.debug("Extracted numpy array metadata for key '%s': Type=%s, Shape=%s, Value=%s", key, type(value), value.shape, value)
                 else:
-                     logging.debug(f"Extracted scalar metadata for key '{key}': Type={type(value)}, Value={value}")
+                     logging.debug("Extracted scalar metadata for key '%s': Type=%s, Value=%s", key, type(value), value)
 
             except (IndexError, TypeError, AttributeError) as e:
-                logging.warning(f"Could not extract value for key '{key}' from {model_path}: {e}")
+                logging.warning("Could not extract value for key '%s' from %s: %s", key, model_path, e)
                 raw_metadata[key] = None # Store None or skip? Store None for now.
             except Exception as e:
                  # Catch any other unexpected errors during extraction
-                 logging.warning(f"Unexpected error extracting value for key '{key}' from {model_path}: {e}\n{traceback.format_exc()}")
+                 logging.warning("Unexpected error extracting value for key '%s' from %s: %s", key, model_path, e, exc_info=True)
                  raw_metadata[key] = None
 
         # Helper to safely get a scalar value from a metadata dictionary, handling lists/tuples/arrays
@@ -198,7 +197,7 @@ def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Opti
                     try:
                         return value.item() # Extracts the single scalar value
                     except Exception as e:
-                        logging.warning(f"Could not extract scalar item from numpy array for key '{key}': {e}")
+                        logging.warning("Could not extract scalar item from numpy array for key '%s': %s", key, e)
                         return default
                 elif value.ndim == 1: # 1D array
                     try:
@@ -208,10 +207,10 @@ def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Opti
                             # Return as a list of Python native types if possible, or string as fallback
                             return value.tolist() # Converts to Python list
                     except Exception as e:
-                        logging.warning(f"Could not convert 1D numpy array for key '{key}': {e}")
+                        logging.warning("Could not convert 1D numpy array for key '%s': %s", key, e)
                         return str(value) # Fallback to string representation
                 else: # Multi-dimensional arrays
-                    logging.warning(f"Unsupported numpy array shape/ndim for key '{key}': {value.shape}. Returning as string.")
+                    logging.warning("Unsupported numpy array shape/ndim for key '%s': %s. Returning as string.", key, value.shape)
                     return str(value) # Fallback to string representation
 
             # Keep unwrapping lists/tuples until a non-container or None is found
@@ -279,7 +278,7 @@ def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Opti
         file_type_val = get_scalar_metadata(raw_metadata, 'general.file_type') # Use the helper to get the raw value
 
         # --- Add debug logging for file_type_val ---
-        logging.debug(f"Raw 'general.file_type' value: {file_type_val}, Type: {type(file_type_val)}")
+        logging.debug("Raw 'general.file_type' value: %s, Type: %s", file_type_val, type(file_type_val))
         # --- End debug logging ---
         if GGUF_AVAILABLE and file_type_val is not None:
             try:
@@ -288,12 +287,12 @@ def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Opti
                     try:
                         file_type_int = int(file_type_val)
                     except ValueError:
-                        logging.warning(f"Could not convert 'general.file_type' string '{file_type_val}' to int for {model_path}.")
+                        logging.warning("Could not convert 'general.file_type' string '%s' to int for %s.", file_type_val, model_path)
                         file_type_int = None
                 elif isinstance(file_type_val, int): # If it's already an int
                     file_type_int = file_type_val
                 else: # If it's neither string nor int
-                    logging.warning(f"'general.file_type' is not an integer or string ({type(file_type_val)}) in {model_path}. Value: {file_type_val}")
+                    logging.warning("'general.file_type' is not an integer or string (%s) in %s. Value: %s", type(file_type_val), model_path, file_type_val)
                     file_type_int = None # Fall through to heuristic
 
                 if file_type_int is not None and LlamaFileType is not None: # Check LlamaFileType availability (it's initialized to None if import fails)
@@ -301,12 +300,12 @@ def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Opti
                         # Use the integer value to get the enum name from LlamaFileType
                         quantization = LlamaFileType(file_type_int).name
                     except ValueError: # Handles cases where the int value is not a valid member of LlamaFileType
-                        logging.warning(f"Integer value {file_type_int} for 'general.file_type' is not a valid LlamaFileType member for {model_path}.")
+                        logging.warning("Integer value %s for 'general.file_type' is not a valid LlamaFileType member for %s.", file_type_int, model_path)
                         quantization = f"Type_{file_type_int}" # Fallback if enum value is unknown
                 # else: file_type_int is None, fall through to heuristic
 
             except Exception as e: # Catch other exceptions during LlamaFileType processing
-                 logging.warning(f"Error processing 'general.file_type' ({file_type_val}) for {model_path}: {e}")
+                 logging.warning("Error processing 'general.file_type' (%s) for %s: %s", file_type_val, model_path, e)
                  # Fall through to heuristic
         # Fallback to heuristic if enum method fails or is not available
         if quantization == "Unknown":
@@ -338,19 +337,19 @@ def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Opti
                  try:
                      max_ctx = int(arch_ctx_val)
                  except (ValueError, TypeError):
-                     logging.warning(f"Could not convert architecture-specific context_length '{arch_ctx_val}' to integer for {model_path}. Using default 4096.")
+                     logging.warning("Could not convert architecture-specific context_length '%s' to integer for %s. Using default 4096.", arch_ctx_val, model_path)
                      max_ctx = 4096 # Ensure it's the default if conversion fails
              else:
-                 logging.warning(f"Architecture-specific context_length key '{ctx_key}' not found for {model_path}. Using default 4096.")
+                 logging.warning("Architecture-specific context_length key '%s' not found for %s. Using default 4096.", ctx_key, model_path)
                  max_ctx = 4096 # Ensure it's the default if key is not found
         else:
-             logging.warning(f"Architecture is unknown for {model_path}. Cannot determine architecture-specific context_length. Using default 4096.")
+             logging.warning("Architecture is unknown for %s. Cannot determine architecture-specific context_length. Using default 4096.", model_path)
              max_ctx = 4096 # Ensure it's the default if architecture is unknown
 
 
         # Ensure max_ctx is an integer (final check)
         if not isinstance(max_ctx, int):
-             logging.warning(f"Final max_context_length '{max_ctx}' is not an integer for {model_path}. Defaulting to 4096.")
+             logging.warning("Final max_context_length '%s' is not an integer for %s. Defaulting to 4096.", max_ctx, model_path)
              max_ctx = 4096
 
 
@@ -373,17 +372,17 @@ def extract_gguf_metadata(model_path: str, model_config: Dict[str, Any]) -> Opti
         # Add raw_metadata to final_metadata
         final_metadata["raw_metadata"] = raw_metadata
 
-        logging.info(f"Successfully extracted metadata for {model_path}")
+        logging.info("Successfully extracted metadata for %s", model_path)
         # --- Add debug logging for the return value ---
-        logging.debug(f"Successfully extracted metadata for {model_path}: {final_metadata}")
+        logging.debug("Successfully extracted metadata for %s: %s", model_path, final_metadata)
         # --- End debug logging ---
         return final_metadata
 
     except Exception as e:
         # Add traceback to the main extraction error logging
-        logging.error(f"Error extracting GGUF metadata from {model_path}: {e}\n{traceback.format_exc()}")
+        logging.error("Error extracting GGUF metadata from %s: %s", model_path, e, exc_info=True)
         # --- Add debug logging for the return value on error ---
-        logging.debug(f"Metadata extraction failed for {model_path}. Returning None.")
+        logging.debug("Metadata extraction failed for %s. Returning None.", model_path)
         # --- End debug logging ---
         return None
 
@@ -409,7 +408,7 @@ def get_model_lmstudio_format(model_name: str, model_path: str, model_config: Di
     # Use file size for caching
     file_size = get_file_size(model_path)
     if file_size is None:
-        logging.error(f"Could not get size for {model_path}. Cannot use cache.")
+        logging.error("Could not get size for %s. Cannot use cache.", model_path)
         # Fallback to extracting without caching if size retrieval fails
         metadata = extract_gguf_metadata(model_path, model_config)
         if metadata:
@@ -441,7 +440,7 @@ def get_model_lmstudio_format(model_name: str, model_path: str, model_config: Di
         
         return cached_metadata
     else:
-        logging.info(f"Cache miss or invalid for {model_name} (size: {file_size}). Extracting metadata...")
+        logging.info("Cache miss or invalid for %s (size: %s). Extracting metadata...", model_name, file_size)
         extracted_metadata = extract_gguf_metadata(model_path, model_config)
         if extracted_metadata:
             # Add state and save to cache
@@ -451,7 +450,7 @@ def get_model_lmstudio_format(model_name: str, model_path: str, model_config: Di
             save_metadata_to_cache(model_name, file_size, extracted_metadata)
             return extracted_metadata
         else:
-            logging.error(f"Failed to extract metadata for {model_name} at {model_path}")
+            logging.error("Failed to extract metadata for %s at %s", model_name, model_path)
             # Return a minimal structure if extraction fails
             return {
                 "id": model_name if "model_id" not in model_config else model_config["model_id"],
@@ -474,7 +473,7 @@ def get_all_models_lmstudio_format(models_config: Dict[str, Dict[str, Any]], is_
     for model_name, model_config in models_config.items():
         model_path = model_config.get("model_path")
         if not model_path:
-            logging.warning(f"Model '{model_name}' has no 'model_path' in config. Skipping metadata.")
+            logging.warning("Model '%s' has no 'model_path' in config. Skipping metadata.", model_name)
             continue
 
         is_running = is_model_running_callback(model_name)
@@ -495,7 +494,7 @@ def get_single_model_lmstudio_format(model_name: str, models_config: Dict[str, D
 
     model_path = model_config.get("model_path")
     if not model_path:
-        logging.warning(f"Model '{model_name}' has no 'model_path' in config. Cannot get metadata.")
+        logging.warning("Model '%s' has no 'model_path' in config. Cannot get metadata.", model_name)
         return None
 
     is_running = is_model_running_callback(model_name)
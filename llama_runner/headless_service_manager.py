@@ -23,14 +23,14 @@ class HeadlessServiceManager:
         self._initialize_services()
 
     def _on_runner_error(self, model_name: str, message: str, output_buffer: List[str]):
-        logger.error(f"Runner error for {model_name}: {message}")
+        logger.error("Runner error for %s: %s", model_name, message)
         # Stop log monitoring for this model
         if model_name in self.log_monitors:
             self.log_monitors[model_name].cancel()
             del self.log_monitors[model_name]
 
     def _on_runner_event(self, message: str):
-        logger.info(f"Runner Manager Event: {message}")
+        logger.info("Runner Manager Event: %s", message)
 
     def _on_runner_started(self, model_name: str):
         self._on_runner_event(f"Started {model_name}")
@@ -86,6 +86,7 @@ class HeadlessServiceManager:
                 request_runner_start_callback=self.llama_runner_manager.request_runner_start,
                 on_runner_port_ready=lambda name, port: None,
                 on_runner_stopped=lambda name: None,
+                prompt_logging_enabled=self.app_config.get("logging", {}).get("prompt_logging_enabled", False),
             )
 
     def start_services(self):
@@ -99,13 +100,18 @@ class HeadlessServiceManager:
 
     async def _monitor_model_logs(self, model_name: str):
         """Monitor logs for a specific model and output status to stdout."""
+        # Each check parses only the lines added since the previous one. If
+        # the runner was replaced in between, the parser starts over.
+        log_cursor = None
         while True:
             try:
                 if self.llama_runner_manager and self.llama_runner_manager.is_llama_runner_running(model_name):
-                    logs = self.llama_runner_manager.get_runner_logs(model_name)
+                    logs, log_cursor, restarted = self.llama_runner_manager.get_runner_logs_since(model_name, log_cursor)
+                    if restarted and model_name in self.log_parsers:
+                        self.log_parsers[model_name] = LlamaLogParser()
                     if logs and model_name in self.log_parsers:
                         parser = self.log_parsers[model_name]
-                        status_info = parser.parse_multiple_lines(logs)
+                        status_info = parser.feed(logs)
                         
                         # Only output if status has changed
                         if model_name not in self.previous_status or self.previous_status[model_name] != status_info:
@@ -120,7 +126,7 @@ class HeadlessServiceManager:
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                logger.error(f"Error monitoring logs for {model_name}: {e}")
+                logger.error("Error monitoring logs for %s: %s", model_name, e)
                 break
 
     def update_config(self, new_config):
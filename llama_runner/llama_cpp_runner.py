@@ -1,9 +1,12 @@
 import asyncio
 import logging
+import os
 import re
 import collections
+import itertools
 import signal
-from typing import Optional, Callable, List
+import weakref
+from typing import Optional, Callable, List, Tuple
 
 from llama_runner.config_loader import CONFIG_DIR, LOG_FILE
 
@@ -13,7 +16,45 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
+logger = logging.getLogger(__name__)
+
+
+def _kill_orphaned_process(process: asyncio.subprocess.Process):
+    # Runs from weakref.finalize, possibly at interpreter exit after the loop
+    # is gone, so signal the pid directly instead of going through asyncio.
+    if process.returncode is not None:
+        return
+    # returncode is only updated on the loop, so without one it can stay None
+    # after the child watcher has reaped the process and its pid has been
+    # reused. Ask the OS whether the pid is still our unreaped child first.
+    # Windows has no WNOHANG, but there the open process handle keeps the
+    # pid from being reused.
+    if hasattr(os, "WNOHANG"):
+        try:
+            pid, _ = os.waitpid(process.pid, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid != 0:
+            return
+    try:
+        os.kill(process.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+    except OSError:
+        pass
+
+
 class LlamaCppRunner:
+    # Number of most recent output lines kept for the UI, log parser and error
+    # reports. The buffer is a ring, so memory stays bounded for long runs.
+    OUTPUT_BUFFER_MAX_LINES = 200
+    # Buffer limit of the stdout StreamReader. The transport is only paused
+    # once twice this much output is waiting, so bursts during prompt
+    # processing do not stall llama.cpp on a full pipe.
+    STDOUT_STREAM_LIMIT = 1024 * 1024
+    # Size of each read from the stdout pipe.
+    STDOUT_READ_SIZE = 64 * 1024
+    # Longest unterminated line kept while waiting for its newline.
+    OUTPUT_LINE_MAX_BYTES = 64 * 1024
+
     def __init__(
         self,
         model_name: str,
@@ -37,83 +78,127 @@ class LlamaCppRunner:
         self.startup_pattern = re.compile(r"main: server is listening on")
         self.alt_startup_pattern = re.compile("HTTP server listening")
         self.port = None
-        self._output_buffer = collections.deque(maxlen=200) # Increased buffer size
+        self._output_buffer = collections.deque(maxlen=self.OUTPUT_BUFFER_MAX_LINES)
+        # Lines appended to _output_buffer so far, including ones it has since
+        # dropped; the cursor handed out by get_output_since().
+        self._output_line_count = 0
         self._is_stopping = False
+        self._stop_task: Optional[asyncio.Future] = None
+        # Kills the process if this runner is dropped while it is still alive;
+        # detached once the process is known to have exited.
+        self._finalizer: Optional[weakref.finalize] = None
+
+    def _handle_output_lines(self, raw_lines: List[bytes]):
+        # The buffer keeps raw bytes; get_output_buffer() decodes on demand, so
+        # lines nobody looks at are never turned into strings.
+        lines = [line.strip() for line in raw_lines]
+        self._output_buffer.extend(lines)
+        self._output_line_count += len(lines)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("llama.cpp[%s]: %s", self.model_name, b"\n".join(lines).decode("utf-8", errors="replace"))
+
+        if self.port is None:
+            for line in lines:
+                decoded_line = line.decode("utf-8", errors="replace")
+                match = self.startup_pattern.search(decoded_line)
+                alt_match = self.alt_startup_pattern.search(decoded_line)
+                if match or alt_match:
+                    port_match = None
+                    if match:
+                        port_match = re.search(r"http://127\.0\.0\.1:(\d+)", decoded_line)
+                    elif alt_match:
+                        port_match = re.search(r'port="(\d+)"', decoded_line)
+
+                    if port_match:
+                        self.port = int(port_match.group(1))
+                        logger.info("llama.cpp server for %s is listening on port %s", self.model_name, self.port)
+                        if self.on_port_ready:
+                            # Runs in the reader task: a failing callback must
+                            # not stop the reader or cancel process.wait() in
+                            # run()'s task group and orphan llama.cpp.
+                            try:
+                                self.on_port_ready(self.model_name, self.port)
+                            except Exception:
+                                logger.error("on_port_ready callback for %s failed.", self.model_name, exc_info=True)
+                        break
+                    else:
+                        logger.warning("Startup line found but port could not be extracted for %s.", self.model_name)
 
     async def _read_output_continuously(self, stream):
+        # Read the pipe in large chunks and split lines ourselves, so a burst of
+        # output costs one wakeup and one log record per chunk instead of per line.
+        # The chunks of an unterminated line are only joined once its newline
+        # arrives, and a line that grows past OUTPUT_LINE_MAX_BYTES is handed
+        # on in pieces of about that size.
+        pending: List[bytes] = []
+        pending_size = 0
         while True:
             try:
-                line = await stream.readline()
-                if not line:
-                    break
-                decoded_line = line.decode("utf-8", errors="replace").strip()
-                self._output_buffer.append(decoded_line)
-                logging.debug(f"llama.cpp[{self.model_name}]: {decoded_line}")
-
-                if self.port is None:
-                    match = self.startup_pattern.search(decoded_line)
-                    alt_match = self.alt_startup_pattern.search(decoded_line)
-                    if match or alt_match:
-                        port_match = None
-                        if match:
-                            port_match = re.search(r"http://127\.0\.0\.1:(\d+)", decoded_line)
-                        elif alt_match:
-                            port_match = re.search(r'port="(\d+)"', decoded_line)
-
-                        if port_match:
-                            self.port = int(port_match.group(1))
-                            logging.info(f"llama.cpp server for {self.model_name} is listening on port {self.port}")
-                            if self.on_port_ready:
-                                self.on_port_ready(self.model_name, self.port)
-                        else:
-                            logging.warning(f"Startup line found but port could not be extracted for {self.model_name}.")
+                chunk = await stream.read(self.STDOUT_READ_SIZE)
             except asyncio.CancelledError:
-                logging.debug(f"Log reader for {self.model_name} cancelled.")
-                break
+                logger.debug("Log reader for %s cancelled.", self.model_name)
+                raise
             except Exception as e:
-                logging.error(f"Error reading output for {self.model_name}: {e}")
+                logger.error("Error reading output for %s: %s", self.model_name, e)
                 break
+            if not chunk:
+                if pending:
+                    self._handle_output_lines([b"".join(pending)])
+                break
+            pending.append(chunk)
+            if b"\n" not in chunk:
+                pending_size += len(chunk)
+                if pending_size >= self.OUTPUT_LINE_MAX_BYTES:
+                    self._handle_output_lines([b"".join(pending)])
+                    pending = []
+                    pending_size = 0
+                continue
+            *complete, tail = b"".join(pending).split(b"\n")
+            self._handle_output_lines(complete)
+            pending = [tail] if tail else []
+            pending_size = len(tail)
 
     async def run(self):
-        log_reader_task = None
         try:
             if self.on_started:
                 self.on_started(self.model_name)
 
             await self.start()
 
-            if self.process and self.process.stdout:
-                log_reader_task = asyncio.create_task(self._read_output_continuously(self.process.stdout))
-            else:
+            if not (self.process and self.process.stdout):
                 raise RuntimeError("Process or stdout not available after start.")
 
-            return_code = await self.process.wait()
-            logging.info(f"Process for {self.model_name} exited with code {return_code}.")
+            # The reader runs to EOF rather than being cancelled once the
+            # process exits, so its last lines are buffered before on_error
+            # reports them. Cancelling run() cancels both tasks.
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._read_output_continuously(self.process.stdout))
+                wait_task = tg.create_task(self.process.wait())
+            return_code = wait_task.result()
+            logger.info("Process for %s exited with code %s.", self.model_name, return_code)
 
             # If the process was told to stop, and it exited with SIGTERM, that's not an error.
             if self._is_stopping and return_code == -signal.SIGTERM:
-                logging.info(f"Llama.cpp server for {self.model_name} was stopped gracefully.")
+                logger.info("Llama.cpp server for %s was stopped gracefully.", self.model_name)
             elif return_code != 0:
                 error_msg = f"Llama.cpp server for {self.model_name} exited unexpectedly with code {return_code}."
-                logging.error(error_msg)
+                logger.error(error_msg)
                 if self.on_error:
                     self.on_error(self.model_name, error_msg, self.get_output_buffer())
 
         except Exception as e:
             error_msg = f"Error running llama.cpp server: {e}"
-            logging.error(error_msg, exc_info=True)
+            logger.error(error_msg, exc_info=True)
             if self.on_error:
                 self.on_error(self.model_name, error_msg, self.get_output_buffer())
         finally:
-            if log_reader_task and not log_reader_task.done():
-                log_reader_task.cancel()
-                await log_reader_task
+            self._detach_finalizer_if_exited()
             if self.on_stopped:
                 self.on_stopped(self.model_name)
 
     async def start(self):
         if self.process and self.process.returncode is None:
-            logging.warning(f"llama.cpp server for {self.model_name} is already running.")
+            logger.warning("llama.cpp server for %s is already running.", self.model_name)
             return
 
         command = [
@@ -130,8 +215,9 @@ class LlamaCppRunner:
             else:
                 command.extend([f"--{arg_name}", str(value)])
 
-        logging.info(f"Starting llama.cpp server with command: {' '.join(command)}")
+        logger.info("Starting llama.cpp server with command: %s", ' '.join(command))
         self._output_buffer.clear()
+        self._output_line_count = 0
 
         try:
             self.process = await asyncio.create_subprocess_exec(
@@ -139,41 +225,62 @@ class LlamaCppRunner:
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.STDOUT,
                 cwd=CONFIG_DIR,
+                limit=self.STDOUT_STREAM_LIMIT,
             )
-            logging.info(f"Process started with PID: {self.process.pid}")
+            logger.info("Process started with PID: %s", self.process.pid)
+            # Do not leave llama.cpp running if this runner is dropped or the
+            # interpreter exits without stop() having been awaited.
+            if self._finalizer is not None:
+                self._finalizer.detach()
+            self._finalizer = weakref.finalize(self, _kill_orphaned_process, self.process)
         except FileNotFoundError:
             error_msg = f"Error: Llama.cpp runtime not found at '{self.llama_cpp_runtime}'."
-            logging.error(error_msg)
+            logger.error(error_msg)
             self.process = None
             raise RuntimeError(error_msg)
         except Exception as e:
             error_msg = f"Error starting llama.cpp server process: {e}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             self.process = None
             raise RuntimeError(error_msg)
 
     async def stop(self):
         if not self.process or self.process.returncode is not None:
-            logging.info(f"stop() called for {self.model_name}, but process was not running.")
+            logger.info("stop() called for %s, but process was not running.", self.model_name)
+            self._detach_finalizer_if_exited()
             return
 
         self._is_stopping = True
 
-        logging.info(f"Stopping {self.model_name} (PID: {self.process.pid}).")
+        # Concurrent stop() calls share one terminate/kill sequence instead of
+        # each signalling the process and running their own timeouts.
+        if self._stop_task is None or self._stop_task.done():
+            self._stop_task = asyncio.ensure_future(self._terminate())
+        await asyncio.shield(self._stop_task)
+        self._detach_finalizer_if_exited()
+
+    def _detach_finalizer_if_exited(self):
+        # A process that may still be running keeps its finalizer.
+        if self._finalizer is not None and self.process is not None and self.process.returncode is not None:
+            self._finalizer.detach()
+            self._finalizer = None
+
+    async def _terminate(self):
+        logger.info("Stopping %s (PID: %s).", self.model_name, self.process.pid)
         try:
             self.process.terminate()
             await asyncio.wait_for(self.process.wait(), timeout=15)
-            logging.info(f"PID: {self.process.pid} for {self.model_name} terminated gracefully.")
+            logger.info("PID: %s for %s terminated gracefully.", self.process.pid, self.model_name)
         except asyncio.TimeoutError:
-            logging.warning(f"Timeout stopping PID: {self.process.pid} for {self.model_name}. Killing.")
+            logger.warning("Timeout stopping PID: %s for %s. Killing.", self.process.pid, self.model_name)
             self.process.kill()
             try:
                 await asyncio.wait_for(self.process.wait(), timeout=5)
-                logging.info(f"PID: {self.process.pid} for {self.model_name} killed.")
+                logger.info("PID: %s for %s killed.", self.process.pid, self.model_name)
             except Exception as kill_e:
-                logging.error(f"Error killing PID: {self.process.pid} for {self.model_name}: {kill_e}")
+                logger.error("Error killing PID: %s for %s: %s", self.process.pid, self.model_name, kill_e)
         except Exception as e:
-            logging.error(f"Exception during termination of PID: {self.process.pid} for {self.model_name}: {e}")
+            logger.error("Exception during termination of PID: %s for %s: %s", self.process.pid, self.model_name, e)
 
     def is_running(self):
         return self.process is not None and self.process.returncode is None
@@ -181,5 +288,18 @@ class LlamaCppRunner:
     def get_port(self):
         return self.port
 
-    def get_output_buffer(self):
-        return list(self._output_buffer)
+    def get_output_buffer(self) -> List[str]:
+        return [line.decode("utf-8", errors="replace") for line in self._output_buffer]
+
+    def get_output_since(self, cursor: int) -> Tuple[List[str], int]:
+        """Return the lines received after the first `cursor` ones and the cursor for the next call.
+
+        Only new lines are decoded. Lines that have already left the buffer
+        are skipped.
+        """
+        new_count = min(self._output_line_count - cursor, len(self._output_buffer))
+        if new_count <= 0:
+            return [], self._output_line_count
+        new_lines = list(itertools.islice(reversed(self._output_buffer), new_count))
+        new_lines.reverse()
+        return [line.decode("utf-8", errors="replace") for line in new_lines], self._output_line_count
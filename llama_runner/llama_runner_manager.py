@@ -1,12 +1,30 @@
 import asyncio
+import functools
 import os
 import logging
-from typing import Optional, Dict, Callable, List
+import weakref
+from typing import Optional, Dict, Callable, List, Tuple
 
 from llama_runner.llama_cpp_runner import LlamaCppRunner
 
+logger = logging.getLogger(__name__)
+
+
+def _set_future_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_future_exception(future: asyncio.Future, exception: BaseException):
+    if not future.done():
+        future.set_exception(exception)
+
 
 class LlamaRunnerManager:
+    # How long stop_all_llama_runners_async lets runner tasks wind down on
+    # their own before cancelling them.
+    _STOP_GRACE_SECS = 2.0
+
     def __init__(
         self,
         models: dict,
@@ -25,14 +43,27 @@ class LlamaRunnerManager:
         self.on_error = on_error
         self.on_port_ready = on_port_ready
 
+        # A runner stays here after its process exits, so its output can still
+        # be read (e.g. after a crash), until it is stopped or replaced.
         self.runners: Dict[str, LlamaCppRunner] = {}
         self.runner_tasks: Dict[str, asyncio.Task] = {}
+        # Number of runner tasks that have not finished yet, kept up to date by
+        # _on_runner_task_done so the start path does not rescan runner_tasks.
+        self._running_count = 0
         self._runner_startup_futures: Dict[str, asyncio.Future] = {}
         self._runner_stop_futures: Dict[str, asyncio.Future] = {}
         self.concurrent_runners_limit = 1
+        # Serializes the runner limit check with spawning the runner.
+        self._start_sema = asyncio.Semaphore(self.concurrent_runners_limit)
+        # LlamaCppRunner constructors with each model's config already
+        # resolved. A config reload builds a new manager, which starts with an
+        # empty cache.
+        self._runner_factories: Dict[str, Callable[..., LlamaCppRunner]] = {}
+        self._start_locks: Dict[str, asyncio.Lock] = {}
 
     def set_concurrent_runners_limit(self, limit: int):
         self.concurrent_runners_limit = limit
+        self._start_sema = asyncio.Semaphore(limit)
 
     def is_llama_runner_running(self, model_name: str) -> bool:
         return model_name in self.runner_tasks and not self.runner_tasks[model_name].done()
@@ -60,98 +91,190 @@ class LlamaRunnerManager:
             return runner.get_output_buffer()
         return []
 
+    def get_runner_logs_since(self, model_name: str, cursor: Optional[Tuple[weakref.ref, int]]) -> Tuple[List[str], Tuple[weakref.ref, int], bool]:
+        """Get the log lines model_name's runner has produced since `cursor`.
+
+        Returns (lines, cursor, restarted); pass None as the first cursor. The
+        cursor remembers which runner it was taken from. If the model's runner
+        has been replaced since, all of the new runner's buffered lines are
+        returned and restarted is True, so the caller can drop what it has
+        from the old one.
+        """
+        runner = self.runners.get(model_name)
+        if runner is None:
+            return [], cursor, False
+
+        runner_ref, line_cursor = cursor if cursor is not None else (None, 0)
+        restarted = runner_ref is None or runner_ref() is not runner
+        if restarted:
+            line_cursor = 0
+        lines, line_cursor = runner.get_output_since(line_cursor)
+        return lines, (weakref.ref(runner), line_cursor), restarted
+
     async def request_runner_start(self, model_name: str) -> int:
-        logging.info(f"Received request to start runner for model: {model_name}")
-        
-        if model_name in self._runner_startup_futures and not self._runner_startup_futures[model_name].done():
-            logging.info(f"Runner for {model_name} is already starting. Returning existing Future.")
-            return await self._runner_startup_futures[model_name]
-        
-        if self.is_llama_runner_running(model_name):
-            port = self.get_runner_port(model_name)
-            if port is not None:
-                logging.info(f"Runner for {model_name} is already running on port {port}. Returning port.")
-                return port
-            else:
-                logging.error(f"Runner for {model_name} is reported as running but port is None.")
-                raise RuntimeError(f"Runner for {model_name} is running but port is unavailable.")
-        
-        running_runners = {name: task for name, task in self.runner_tasks.items() if not task.done()}
-        if len(running_runners) >= self.concurrent_runners_limit:
-            if self.concurrent_runners_limit == 1:
-                logging.info(f"Concurrent runner limit reached. Stopping all existing runners before starting {model_name}.")
-                await self.stop_all_llama_runners_async()
+        logger.info("Received request to start runner for model: %s", model_name)
+
+        # Concurrent requests for the same model are serialized up to the point
+        # where the startup future exists, so only one of them spawns a runner
+        # and the rest wait on that future.
+        lock = self._start_locks.setdefault(model_name, asyncio.Lock())
+        async with lock:
+            future = self._runner_startup_futures.get(model_name)
+            if future is not None and not future.done():
+                logger.info("Runner for %s is already starting. Returning existing Future.", model_name)
+            elif self.is_llama_runner_running(model_name):
+                port = self.get_runner_port(model_name)
+                if port is not None:
+                    logger.info("Runner for %s is already running on port %s. Returning port.", model_name, port)
+                    return port
+                else:
+                    logger.error("Runner for %s is reported as running but port is None.", model_name)
+                    raise RuntimeError(f"Runner for {model_name} is running but port is unavailable.")
             else:
-                raise RuntimeError(f"Concurrent runner limit ({self.concurrent_runners_limit}) reached.")
-        
-        future = asyncio.get_running_loop().create_future()
-        self._runner_startup_futures[model_name] = future
-    
-        logging.info(f"Created future for {model_name}: {id(future)}")
-        
-        def _on_port_ready_wrapper(name, port):
-            fut = self._runner_startup_futures.get(name)
-            if fut and not fut.done():
-                fut.set_result(port)
-            # cleanup
-            self._runner_startup_futures.pop(name, None)
-            self.on_port_ready(name, port)
-    
-        def _on_error_wrapper(name, message, output_buffer):
-            future = self._runner_startup_futures.get(name)
-            if future and not future.done():
-                future.set_exception(RuntimeError(message))
-            self.on_error(name, message, output_buffer)
-    
+                future = await self._spawn_runner(model_name)
+
+        # Shield the shared startup future: a cancelled caller (e.g. a client
+        # disconnect) must not cancel it for other waiters. The runner keeps
+        # starting and is reused by the next request for this model.
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            logger.info("Start request for %s was cancelled; leaving the runner to finish starting.", model_name)
+            raise
+
+    def _get_runner_factory(self, model_name: str) -> Callable[..., LlamaCppRunner]:
+        """Return a LlamaCppRunner constructor with model_name's config bound.
+
+        The runtime command and model path are resolved on the first start
+        only; later starts of the same model reuse the result. The model file
+        is checked on every start, since it may have been moved or deleted
+        since the last one.
+        """
+        factory = self._runner_factories.get(model_name)
+        if factory is not None:
+            if not os.path.exists(factory.keywords["model_path"]):
+                raise RuntimeError("Invalid configuration or file not found.")
+            return factory
+
         model_config = self.models[model_name]
         model_path = model_config.get("model_path")
         llama_cpp_runtime_key = model_config.get("llama_cpp_runtime", "default")
         _raw_llama_cpp_runtime_config = self.llama_runtimes.get(llama_cpp_runtime_key, self.default_runtime)
-    
+
         if isinstance(_raw_llama_cpp_runtime_config, dict):
             llama_cpp_runtime_command = _raw_llama_cpp_runtime_config.get("runtime", self.default_runtime)
         else:
             llama_cpp_runtime_command = _raw_llama_cpp_runtime_config or self.default_runtime
-    
-        if not all([llama_cpp_runtime_command, model_path, os.path.exists(model_path)]):
+
+        if not llama_cpp_runtime_command or not model_path:
              raise RuntimeError("Invalid configuration or file not found.")
-    
-        runner = LlamaCppRunner(
+        if not os.path.exists(model_path):
+            raise RuntimeError("Invalid configuration or file not found.")
+
+        factory = functools.partial(
+            LlamaCppRunner,
             model_name=model_name,
             model_path=model_path,
             llama_cpp_runtime=llama_cpp_runtime_command,
             on_started=self.on_started,
-            on_stopped=self.on_stopped,
+            **model_config.get("parameters", {})
+        )
+        self._runner_factories[model_name] = factory
+        return factory
+
+    async def _spawn_runner(self, model_name: str) -> asyncio.Future:
+        """Start a runner task for model_name and return its startup future.
+
+        The future resolves to the runner's port, or fails if the runner errors
+        or stops before it reports one.
+        """
+        runner_factory = self._get_runner_factory(model_name)
+
+        # Held from the limit check until the runner task exists, so parallel
+        # requests for different models cannot all find room for one more
+        # runner. It is not held while the model loads: with a limit of 1 a
+        # request for another model stops a runner that is still starting
+        # instead of waiting for it.
+        async with self._start_sema:
+            if self._running_count >= self.concurrent_runners_limit:
+                if self.concurrent_runners_limit == 1:
+                    logger.info("Concurrent runner limit reached. Stopping all existing runners before starting %s.", model_name)
+                    await self.stop_all_llama_runners_async()
+                else:
+                    raise RuntimeError(f"Concurrent runner limit ({self.concurrent_runners_limit}) reached.")
+            return self._start_runner_task(model_name, runner_factory)
+
+    def _start_runner_task(self, model_name: str, runner_factory: Callable[..., LlamaCppRunner]) -> asyncio.Future:
+        """Create model_name's runner and its task, and return the startup future."""
+        future = asyncio.get_running_loop().create_future()
+        self._runner_startup_futures[model_name] = future
+        logger.info("Created future for %s: %s", model_name, id(future))
+        
+        # The runner callbacks fire from the runner's task on this loop, so
+        # the startup future is resolved directly.
+        def _on_port_ready_wrapper(name, port):
+            fut = self._runner_startup_futures.get(name)
+            if fut:
+                _set_future_result(fut, port)
+            # cleanup
+            self._runner_startup_futures.pop(name, None)
+            self.on_port_ready(name, port)
+    
+        def _on_error_wrapper(name, message, output_buffer):
+            fut = self._runner_startup_futures.get(name)
+            if fut:
+                _set_future_exception(fut, RuntimeError(message))
+            self.on_error(name, message, output_buffer)
+
+        def _on_stopped_wrapper(name):
+            # A runner that exits before reporting a port must not leave its
+            # callers waiting forever.
+            fut = self._runner_startup_futures.pop(name, None)
+            if fut:
+                _set_future_exception(fut, RuntimeError(f"Runner for {name} stopped before it became ready."))
+            self.on_stopped(name)
+
+        runner = runner_factory(
+            on_stopped=_on_stopped_wrapper,
             on_error=_on_error_wrapper,
             on_port_ready=_on_port_ready_wrapper,
-            **model_config.get("parameters", {})
         )
         self.runners[model_name] = runner
         task = asyncio.create_task(runner.run())
         self.runner_tasks[model_name] = task
-        return await future
+        self._running_count += 1
+        task.add_done_callback(lambda t, name=model_name: self._on_runner_task_done(name, t))
+        return future
+
+    def _on_runner_task_done(self, model_name: str, task: asyncio.Task):
+        # Drop the bookkeeping for runners that exited on their own (crash,
+        # process exit) so they do not linger until the next explicit stop.
+        self._running_count -= 1
+        if self.runner_tasks.get(model_name) is task:
+            del self.runner_tasks[model_name]
 
     async def stop_llama_runner(self, model_name: str):
-        logging.info(f"Stopping Llama Runner for {model_name}...")
-        if model_name in self.runner_tasks:
-            task = self.runner_tasks[model_name]
-            runner = self.runners[model_name]
+        logger.info("Stopping Llama Runner for %s...", model_name)
+        task = self.runner_tasks.get(model_name)
+        runner = self.runners.get(model_name)
+        if task is None and runner is None:
+            logger.warning("Attempted to stop a non-existent runner: %s", model_name)
+            return
 
-            if not task.done():
+        if task is not None and not task.done():
+            if runner is not None:
                 await runner.stop()
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    logging.info(f"Task for {model_name} cancelled successfully.")
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                logger.info("Task for %s cancelled successfully.", model_name)
 
-            del self.runner_tasks[model_name]
-            del self.runners[model_name]
-        else:
-            logging.warning(f"Attempted to stop a non-existent runner: {model_name}")
+        self.runner_tasks.pop(model_name, None)
+        self.runners.pop(model_name, None)
 
     async def stop_all_llama_runners_async(self):
-        logging.info("Stopping all Llama Runners asynchronously...")
+        logger.info("Stopping all Llama Runners asynchronously...")
         
         # Snapshot current runners and tasks (dicts may mutate)
         # Make sure we only operate on the runners that existed at the start
@@ -161,22 +284,20 @@ class LlamaRunnerManager:
         runners = list(runners_to_stop.values())
         tasks = list(tasks_to_stop.values())
         
-        # Phase 1: ask all runners to stop (this should let run() exit)
-        for runner in runners:
-            try:
-                await runner.stop()
-            except Exception as e:
+        # Phase 1: ask all runners to stop concurrently (this should let run() exit)
+        results = await asyncio.gather(*(runner.stop() for runner in runners), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
                 # Avoid accessing .model_name on mocks that might not have it
-                logging.error(f"Error while stopping runner: {e}")
+                logger.error("Error while stopping runner: %s", result)
         
-        # Phase 2: give tasks a chance to finish without cancelling first
+        # Phase 2: give tasks a bounded chance to finish without cancelling first
         pending = [t for t in tasks if not t.done()]
+        still_pending = set()
         if pending:
-            # Short grace await; no cancellation yet
-            await asyncio.gather(*pending, return_exceptions=True)
+            _, still_pending = await asyncio.wait(pending, timeout=self._STOP_GRACE_SECS)
         
         # Phase 3: if any still pending (rare), cancel and await again
-        still_pending = [t for t in tasks if not t.done()]
         if still_pending:
             for t in still_pending:
                 t.cancel()
@@ -1,9 +1,11 @@
 import asyncio
 
+import functools
 import logging
-import traceback
+import time
 import json
-from typing import Dict, Any, Callable, Optional, AsyncGenerator
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Optional, AsyncGenerator, AsyncIterator, List, NamedTuple, Tuple
 
 # Removed: from litellm.proxy.proxy_server import app
 # Standard library imports
@@ -11,7 +13,7 @@ import httpx
 
 # Third-party imports
 from fastapi import FastAPI, HTTPException, Request, status
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.routing import APIRoute # Import APIRoute for isinstance check
 import uvicorn
 
@@ -19,45 +21,351 @@ import uvicorn
 from llama_runner import gguf_metadata # Import the new metadata module
 from llama_runner.config_loader import calculate_system_fingerprint
 
+# orjson is optional: it parses and serializes several times faster than the
+# json module and works on bytes directly, which matters for large chat
+# payloads and per-chunk SSE rewriting. orjson.JSONDecodeError subclasses
+# json.JSONDecodeError, so callers only need to catch the latter.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Bound straight to orjson's functions when available, so the per-chunk SSE
+# paths make a single C call rather than going through a wrapper.
+if orjson is not None:
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+else:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+
+# SSE framing: each event is a "data: " line followed by a blank line.
+_SSE_PREFIX = b'data: '
+_SSE_SUFFIX = b'\n\n'
+_SSE_DONE = _SSE_PREFIX + b'[DONE]' + _SSE_SUFFIX
+
+# Byte probe for runner payloads that already carry a fingerprint. The key
+# cannot match inside a JSON string, where its quotes would be escaped, but it
+# can match the key of a nested object.
+_FINGERPRINT_KEY = b'"system_fingerprint"'
+
+
+class _ResponseLogBuffer:
+    """
+    Keeps the last `limit` bytes of a forwarded response for prompt logging,
+    so logging a long generation does not hold the whole response in memory.
+    """
+
+    def __init__(self, limit: int = 64 * 1024):
+        self.limit = limit
+        self.truncated = False
+        self._buf = bytearray()
+
+    def __bool__(self) -> bool:
+        return bool(self._buf)
+
+    def append(self, chunk: bytes):
+        self._buf += chunk
+        overflow = len(self._buf) - self.limit
+        if overflow > 0:
+            del self._buf[:overflow]
+            self.truncated = True
+
+    def data(self) -> bytes:
+        return bytes(self._buf)
+
+
+class _SSEEventSplitter:
+    """
+    Reassembles a runner's SSE byte stream into events, returned without their
+    blank-line terminator. A network chunk can carry several events or only
+    part of one, so chunks cannot be parsed one by one. CRLF line endings are
+    normalized to LF.
+    """
+    __slots__ = ('_buf',)
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Adds a chunk and returns the events it completed."""
+        buf = self._buf
+        buf += chunk
+        # Checked on the buffer, not the chunk: a CR may have arrived at the
+        # end of the previous chunk.
+        if b'\r' in buf:
+            buf = self._buf = bytearray(buf.replace(b'\r\n', b'\n'))
+        events = []
+        start = 0
+        while True:
+            end = buf.find(_SSE_SUFFIX, start)
+            if end == -1:
+                break
+            events.append(bytes(buf[start:end]))
+            start = end + len(_SSE_SUFFIX)
+        if start:
+            del buf[:start]
+        return events
+
+    def pending(self) -> bytes:
+        """Returns and clears the bytes of the event still being received."""
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+async def _iter_sse_events(chunks: AsyncIterator[bytes]) -> AsyncGenerator[bytes, None]:
+    """Yields the events of an SSE byte stream, see _SSEEventSplitter."""
+    splitter = _SSEEventSplitter()
+    async for chunk in chunks:
+        for event in splitter.feed(chunk):
+            yield event
+    tail = splitter.pending()
+    if tail.strip():
+        yield tail
+
+
+def _sse_event_data(event: bytes) -> Optional[bytes]:
+    """
+    Returns the data of an SSE event, or None if it has no data field.
+
+    Runners send one "data: " line per event, which is sliced off directly.
+    Anything else is parsed per the SSE spec: data lines are joined with
+    newlines, a single space after the colon is dropped, and comments and
+    event/id/retry fields are ignored.
+    """
+    if event.startswith(_SSE_PREFIX) and b'\n' not in event:
+        return event[len(_SSE_PREFIX):]
+    data_lines = []
+    for line in event.split(b'\n'):
+        field, _, value = line.partition(b':')
+        if field == b'data':
+            data_lines.append(value[1:] if value.startswith(b' ') else value)
+    return b'\n'.join(data_lines) if data_lines else None
+
+
+
+def _json_has_fingerprint(body: bytes) -> bool:
+    """
+    Returns whether body is a JSON object with a system_fingerprint at its
+    top level. Only bodies the byte probe matches are parsed.
+    """
+    if _FINGERPRINT_KEY not in body:
+        return False
+    try:
+        payload = _json_loads(body)
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and 'system_fingerprint' in payload
+
+
+def _sse_event_has_fingerprint(event: bytes) -> bool:
+    """
+    Returns whether the JSON object in an SSE event has a system_fingerprint
+    at its top level. Only events the byte probe matches are parsed.
+    """
+    if _FINGERPRINT_KEY not in event:
+        return False
+    data = _sse_event_data(event)
+    return data is not None and _json_has_fingerprint(data)
+
+
+def _sse_fingerprinter(system_fingerprint: str) -> Callable[[bytes], bytes]:
+    """
+    Returns a function that turns an SSE event into the frame relaying it, with
+    system_fingerprint added to its JSON object. [DONE], non-data events and
+    payloads that are not objects are relayed unchanged.
+    """
+    # Module globals used per event, bound once for the stream
+    json_loads, json_dumps = _json_loads, _json_dumps
+    sse_prefix, sse_suffix = _SSE_PREFIX, _SSE_SUFFIX
+    prefix_len = len(sse_prefix)
+    # Replaces a payload's closing brace and ends the frame. It is cut from
+    # json_dumps output, so a spliced compact payload has the same bytes a
+    # parse/serialize round-trip would produce.
+    with_fingerprint = json_dumps({'a': 0, 'system_fingerprint': system_fingerprint})
+    fingerprint_tail = with_fingerprint[len(json_dumps({'a': 0})) - 1:] + sse_suffix
+
+    def fingerprinted(event: bytes) -> bytes:
+        """Returns the frame relaying event with the fingerprint added."""
+        try:
+            if not event.startswith(sse_prefix):
+                return event + sse_suffix
+            json_payload = event[prefix_len:]
+            if json_payload == b'[DONE]':
+                return event + sse_suffix
+            # Add the fingerprint to a non-empty object without a
+            # parse/serialize round-trip; anything else is parsed.
+            json_payload = json_payload.strip()
+            if json_payload.startswith(b'{') and json_payload.endswith(b'}'):
+                body_end = len(json_payload) - 1
+                if json_payload[:body_end].rstrip() != b'{':
+                    return b''.join((sse_prefix, memoryview(json_payload)[:body_end], fingerprint_tail))
+            try:
+                data_json = json_loads(json_payload)
+                if isinstance(data_json, dict) and 'system_fingerprint' not in data_json:
+                    data_json['system_fingerprint'] = system_fingerprint
+                    return b''.join((sse_prefix, json_dumps(data_json), sse_suffix))
+            except json.JSONDecodeError:
+                logging.warning("Could not decode JSON from streaming chunk: %s", json_payload.decode('utf-8', errors='replace'))
+        except Exception as e: # pylint: disable=broad-except
+            logging.error("Error processing streaming chunk: %s", e, exc_info=True)
+        return event + sse_suffix
+
+    return fingerprinted
+
+# Bound on prompt-log records waiting for the writer task; when it is reached
+# the oldest record is dropped so logging never holds up a request.
+_PROMPT_LOG_QUEUE_SIZE = 1000
+
+
+def _emit_prompt_log(prompts_logger: logging.Logger, level: int, msg: str, args: tuple):
+    # Bodies are queued as bytes and only decoded here, off the request path.
+    prompts_logger.log(level, msg, *(
+        arg.decode('utf-8', errors='replace') if isinstance(arg, bytes) else arg for arg in args
+    ))
+
+
+def _log_prompt(app_state, level: int, msg: str, *args):
+    """
+    Queues a prompt-log record for the writer task started by
+    LMStudioProxyServer. Logs it directly when no writer is running.
+    """
+    queue = getattr(app_state, 'prompt_log_queue', None)
+    if queue is None:
+        _emit_prompt_log(getattr(app_state, 'prompts_logger', logging.getLogger()), level, msg, args)
+        return
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait((level, msg, args))
+
+
+async def _prompt_log_worker(queue: asyncio.Queue, prompts_logger: logging.Logger):
+    while True:
+        level, msg, args = await queue.get()
+        try:
+            _emit_prompt_log(prompts_logger, level, msg, args)
+        except Exception as e:
+            logging.error("Error writing prompt log record: %s", e)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered through _json_dumps, i.e. with orjson when available."""
+
+    def render(self, content: Any) -> bytes:
+        return _json_dumps(content)
+
 # Configure logging (already done in main.py for configurable levels)
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Create our own FastAPI app instance ---
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 # --- End create app instance ---
 
 
+def _get_model_id_mappings(app_state) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Returns (internal name -> LM Studio ID, LM Studio ID -> internal name).
+
+    Building the mapping reads every model's metadata, so it is cached on
+    app_state for the current all_models_config object. A config reload
+    installs a new dict, which rebuilds it.
+    """
+    all_models_config = app_state.all_models_config
+    cached = getattr(app_state, 'model_id_mappings_cache', None)
+    if cached is not None and cached[0] is all_models_config:
+        return cached[1], cached[2]
+    name_to_id = gguf_metadata.get_model_name_to_id_mapping(all_models_config)
+    id_to_name = {v: k for k, v in name_to_id.items()}
+    app_state.model_id_mappings_cache = (all_models_config, name_to_id, id_to_name)
+    return name_to_id, id_to_name
+
+
+class _ModelRuntimeInfo(NamedTuple):
+    runtime_name: Optional[str]
+    runtime_configured: bool
+    supports_tools: Optional[bool]
+    system_fingerprint: str
+
+
+def _get_model_runtime_index(app_state) -> Dict[str, _ModelRuntimeInfo]:
+    """
+    Returns each model's runtime name, whether that runtime is configured,
+    its supports_tools flag and its system fingerprint, so forwarding does not
+    walk both configs or hash the model config per request. Cached on
+    app_state like the ID mappings.
+    """
+    all_models_config = app_state.all_models_config
+    runtimes_config = app_state.runtimes_config
+    cached = getattr(app_state, 'model_runtime_index_cache', None)
+    if cached is not None and cached[0] is all_models_config and cached[1] is runtimes_config:
+        return cached[2]
+    index = {}
+    for model_name, model_config in all_models_config.items():
+        runtime_name = model_config.get("llama_cpp_runtime") if model_config else None
+        runtime_config = runtimes_config.get(runtime_name) if runtime_name else None
+        index[model_name] = _ModelRuntimeInfo(
+            runtime_name=runtime_name,
+            runtime_configured=bool(runtime_config),
+            # Runtimes may also be configured as a bare command string
+            supports_tools=runtime_config.get("supports_tools") if isinstance(runtime_config, dict) else None,
+            system_fingerprint=calculate_system_fingerprint(model_config),
+        )
+    app_state.model_runtime_index_cache = (all_models_config, runtimes_config, index)
+    return index
+
+
+# How long a rendered /api/v0/models response is reused, in seconds.
+_MODELS_RESPONSE_TTL = 2.0
+
 # Define standalone handlers that access state via app.state
 @app.get("/api/v0/models")
 async def _get_lmstudio_models_handler(request: Request):
     """Handler for GET /api/v0/models"""
     # Access state from the request's app instance
     # Access state from the request's app instance
-    all_models_config = request.app.state.all_models_config # Use all_models_config
-    is_model_running_callback = request.app.state.is_model_running_callback
+    state = request.app.state
+    all_models_config = state.all_models_config # Use all_models_config
+    is_model_running_callback = state.is_model_running_callback
 
     if not gguf_metadata.GGUF_AVAILABLE:
-         return JSONResponse(content={"error": "GGUF library not available for metadata extraction."}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+         return FastJSONResponse(content={"error": "GGUF library not available for metadata extraction."}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    # The rendered list depends only on the config and on which models are
+    # running; reuse it for a short while since clients poll this endpoint.
+    running_models = frozenset(name for name in all_models_config if is_model_running_callback(name))
+    cached = getattr(state, 'models_response_cache', None)
+    now = time.monotonic()
+    if (cached is not None and cached[0] is all_models_config
+            and cached[1] == running_models and now < cached[2]):
+        return Response(content=cached[3], media_type='application/json')
 
     try:
         all_models_data = gguf_metadata.get_all_models_lmstudio_format(
             all_models_config, is_model_running_callback
         )
         # Add capabilities for models with has_tools
-        id_mapping = gguf_metadata.get_model_name_to_id_mapping(all_models_config)
-        id_to_internal = {v: k for k, v in id_mapping.items()}
+        _, id_to_internal = _get_model_id_mappings(state)
         for model in all_models_data:
             internal_name = id_to_internal.get(model['id'])
             if internal_name:
                 model_config = all_models_config.get(internal_name, {})
                 if model_config.get('has_tools'):
                     model['capabilities'] = ["tool_use"]
-        return JSONResponse(content={
+        response_body = _json_dumps({
             "object": "list",
             "data": all_models_data
         })
+        state.models_response_cache = (
+            all_models_config, running_models, now + _MODELS_RESPONSE_TTL, response_body
+        )
+        return Response(content=response_body, media_type='application/json')
     except Exception as e:
-        logging.error(f"Error handling /api/v0/models: {e}\n{traceback.format_exc()}")
+        logging.error("Error handling /api/v0/models: %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error retrieving models metadata")
 
 @app.get("/api/v0/models/{model_id}")
@@ -79,121 +387,141 @@ async def _get_lmstudio_model_handler(model_id: str, request: Request):
         )
 
         if model_data:
-            return JSONResponse(content=model_data)
+            return FastJSONResponse(content=model_data)
         else:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Model with id '{model_id}' not found")
 
     except Exception as e:
-        logging.error(f"Error handling /api/v0/models/{model_id}: {e}\n{traceback.format_exc()}")
+        logging.error("Error handling /api/v0/models/%s: %s", model_id, e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error retrieving model metadata")
 
 
 # --- Handler for dynamic routing of /v1/* requests ---
 
-# --- New function for non-streaming responses ---
-async def _fetch_non_streaming_v1_response(
+# Client headers that are passed on to the runner. Everything else (host,
+# content-length, cookies, browser headers...) is either set by httpx for the
+# outgoing request or means nothing to llama.cpp. Matched against the raw ASGI
+# header names, which are lowercase bytes.
+_FORWARD_HEADERS = frozenset({b'authorization', b'content-type', b'accept', b'accept-encoding', b'x-request-id'})
+
+class _ForwardError(Exception):
+    """Raised by _prepare_forward when a request cannot be sent to a runner."""
+
+    def __init__(self, message: str, error_type: str):
+        super().__init__(message)
+        self.payload = {"error": {"message": message, "type": error_type}}
+
+
+# SSE frames for the _ForwardErrors whose message never varies, keyed by message.
+_STATIC_SSE_ERROR_FRAMES = {
+    message: _SSE_PREFIX + _json_dumps(_ForwardError(message, error_type).payload) + _SSE_SUFFIX
+    for message, error_type in (
+        ("Internal server error: Proxy not configured.", "internal_error"),
+        ("Model name not specified in request body.", "invalid_request_error"),
+    )
+}
+
+
+@dataclass(slots=True)
+class _ForwardPlan:
+    """Where and what to forward, as resolved by _prepare_forward."""
+    model_name: str               # Internal model name (key in all_models_config)
+    model_name_from_request: str  # Model ID as sent by the client
+    port: int
+    target_url: str
+    body_bytes: bytes
+    system_fingerprint: str
+
+
+async def _prepare_forward(
     request: Request,
-    target_path: Optional[str] = None,
-    body: Optional[dict] = None,
-    body_bytes: Optional[bytes] = None
-) -> Dict[str, Any] | list[Any]:
+    target_path: Optional[str],
+    body: Any,
+    body_bytes: bytes
+) -> _ForwardPlan:
     """
-    Handles non-streaming /v1/* requests. It ensures the target runner is running,
-    forwards the request, and returns the complete response as a dictionary.
+    Common part of the streaming and non-streaming forwarders: maps the requested
+    model ID to a configured model, applies its runtime settings to the body and
+    makes sure its runner is up. Raises _ForwardError with the error payload for
+    the client if any of that fails.
     """
     # Access state and callbacks from the request's app instance
-    all_models_config = request.app.state.all_models_config
-    runtimes_config = request.app.state.runtimes_config
-    get_runner_port_callback = request.app.state.get_runner_port_callback
-    request_runner_start_callback = request.app.state.request_runner_start_callback
-    prompt_logging_enabled = getattr(request.app.state, 'prompt_logging_enabled', False)
-    prompts_logger = getattr(request.app.state, 'prompts_logger', logging.getLogger())
-    proxy_thread_instance = getattr(request.app.state, 'proxy_thread_instance', None)
+    state = request.app.state
+    all_models_config = state.all_models_config
+    runtimes_config = state.runtimes_config
+    get_runner_port_callback = state.get_runner_port_callback
+    prompt_logging_enabled = getattr(state, 'prompt_logging_enabled', False)
+    proxy_thread_instance = getattr(state, 'proxy_thread_instance', None)
 
     if not proxy_thread_instance:
         logging.error("proxy_thread_instance not found in app.state")
-        return {"error": {"message": "Internal server error: Proxy not configured.", "type": "internal_error"}}
+        raise _ForwardError("Internal server error: Proxy not configured.", "internal_error")
     # The instance is the LMStudioProxyServer itself.
     proxy_server = proxy_thread_instance
 
-
     # Extract the model name from the request body
     try:
-        # If not provided, read the body here (for backward compatibility, but should always be passed in)
-        if body is None or body_bytes is None:
-            body_bytes = await request.body()
-            body = {}
-            if body_bytes:
-                try:
-                    body = json.loads(body_bytes)
-                except json.JSONDecodeError:
-                    body = None
-                    logging.warning(f"Could not decode request body as JSON for {request.url.path}")
-                    return {"error": {"message": "Invalid JSON request body.", "type": "invalid_request_error"}}
-        
+        # The handler has parsed the body once already; body_bytes is what gets
+        # forwarded unless the body is rewritten below.
         model_name_from_request = None
         if isinstance(body, dict):
             model_name_from_request = body.get("model")
         
         if not model_name_from_request:
-            logging.warning(f"Model name not found in request body for {request.url.path}")
-            return {"error": {"message": "Model name not specified in request body.", "type": "invalid_request_error"}}
+            logging.warning("Model name not found in request body for %s", request.url.path)
+            raise _ForwardError("Model name not specified in request body.", "invalid_request_error")
 
         # Log the incoming request if prompt logging is enabled
         if prompt_logging_enabled:
             try:
-                # Log the request body as a JSON string
-                prompts_logger.info(f"Request to {request.url.path} for model '{model_name_from_request}': {json.dumps(body)}")
+                # Log the body as received rather than re-serializing the parsed dict
+                _log_prompt(state, logging.INFO, "Request to %s for model '%s': %s", request.url.path, model_name_from_request, body_bytes)
             except Exception as log_e:
-                logging.error(f"Error logging request body for {request.url.path}: {log_e}")
+                logging.error("Error logging request body for %s: %s", request.url.path, log_e)
 
+    except _ForwardError:
+        raise
     except Exception as e:
-        logging.error(f"Error reading request body or extracting model name: {e}\n{traceback.format_exc()}")
-        return {"error": {"message": f"Invalid request: {e}", "type": "invalid_request_error"}}
+        logging.error("Error reading request body or extracting model name: %s", e, exc_info=True)
+        raise _ForwardError(f"Invalid request: {e}", "invalid_request_error")
 
-    logging.debug(f"Intercepted request for model (ID from request): {model_name_from_request} at path: {request.url.path}")
-    logging.debug(f"Available models in all_models_config: {list(all_models_config.keys())}")
-    logging.debug(f"Available runtimes in runtimes_config: {list(runtimes_config.keys())}")
-
-    logging.debug(f"Intercepted request for model (ID from request): {model_name_from_request} at path: {request.url.path}")
-    logging.debug(f"Available models in all_models_config: {list(all_models_config.keys())}")
-    logging.debug(f"Available runtimes in runtimes_config: {list(runtimes_config.keys())}")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Intercepted request for model (ID from request): %s at path: %s", model_name_from_request, request.url.path)
+        logging.debug("Available models in all_models_config: %s", list(all_models_config.keys()))
+        logging.debug("Available runtimes in runtimes_config: %s", list(runtimes_config.keys()))
 
     # LM Studio uses an ID format (e.g., "vendor/model-file.gguf") in requests.
     # We need to map this ID back to our internal model name (the key in all_models_config).
     # The gguf_metadata.get_model_name_to_id_mapping uses all_models_config.
-    id_to_internal_name_mapping = {v: k for k, v in gguf_metadata.get_model_name_to_id_mapping(all_models_config).items()}
+    _, id_to_internal_name_mapping = _get_model_id_mappings(state)
     internal_model_name = id_to_internal_name_mapping.get(model_name_from_request)
 
     if not internal_model_name:
         # Fallback: if the request model_name is already an internal name (should not happen for LM Studio proxy)
         if model_name_from_request in all_models_config:
             internal_model_name = model_name_from_request
-            logging.warning(f"Request model ID '{model_name_from_request}' matched an internal model name directly. This might indicate a misconfiguration or unexpected request format.")
+            logging.warning("Request model ID '%s' matched an internal model name directly. This might indicate a misconfiguration or unexpected request format.", model_name_from_request)
         else:
-            logging.warning(f"Request for unknown model ID: {model_name_from_request}. Could not map to an internal model name.")
-            return {"error": {"message": f"Model ID '{model_name_from_request}' not found in configuration mapping.", "type": "invalid_request_error"}}
+            logging.warning("Request for unknown model ID: %s. Could not map to an internal model name.", model_name_from_request)
+            raise _ForwardError(f"Model ID '{model_name_from_request}' not found in configuration mapping.", "invalid_request_error")
     
-    logging.debug(f"Mapped request model ID '{model_name_from_request}' to internal model name '{internal_model_name}'")
+    logging.debug("Mapped request model ID '%s' to internal model name '%s'", model_name_from_request, internal_model_name)
 
-    # Get the specific model's configuration details from all_models_config using the internal_model_name
-    model_config_details = all_models_config.get(internal_model_name)
-    runtime_name_for_model = model_config_details.get("llama_cpp_runtime") if model_config_details else None
+    # Look up the model's runtime details from the precomputed index
+    runtime_info = _get_model_runtime_index(state).get(internal_model_name)
+    runtime_name_for_model = runtime_info.runtime_name if runtime_info else None
 
     if not runtime_name_for_model:
-        logging.warning(f"Runtime not defined for model '{internal_model_name}' (from request ID '{model_name_from_request}') in main configuration.")
-        return {"error": {"message": f"Runtime not configured for model '{internal_model_name}'.", "type": "configuration_error"}}
-
-    # Get the runtime's configuration from runtimes_config
-    runtime_details_from_config = runtimes_config.get(runtime_name_for_model)
+        logging.warning("Runtime not defined for model '%s' (from request ID '%s') in main configuration.", internal_model_name, model_name_from_request)
+        raise _ForwardError(f"Runtime not configured for model '{internal_model_name}'.", "configuration_error")
 
-    if not runtime_details_from_config:
-        logging.warning(f"Configuration for runtime '{runtime_name_for_model}' (for model '{internal_model_name}') not found in runtimes configuration.")
-        return {"error": {"message": f"Configuration for runtime '{runtime_name_for_model}' not found.", "type": "configuration_error"}}
+    if not runtime_info.runtime_configured:
+        logging.warning("Configuration for runtime '%s' (for model '%s') not found in runtimes configuration.", runtime_name_for_model, internal_model_name)
+        raise _ForwardError(f"Configuration for runtime '{runtime_name_for_model}' not found.", "configuration_error")
 
     # Conditionally remove 'tools' and 'tool_choice' from the request body
     if body_bytes and body: # Ensure body was successfully parsed
-        if runtime_details_from_config.get("supports_tools") is False:
+        if runtime_info.supports_tools is False:
             tools_present_in_request = "tools" in body
             tool_choice_present_in_request = "tool_choice" in body
 
@@ -204,11 +532,12 @@ async def _fetch_non_streaming_v1_response(
 
             if tools_present_in_request or tool_choice_present_in_request:
                 logging.info(
-                    f"Model '{internal_model_name}' (request ID: '{model_name_from_request}', runtime: '{runtime_name_for_model}') "
-                    f"has supports_tools=False. Removed 'tools' and/or 'tool_choice' from request to {request.url.path}."
+                    "Model '%s' (request ID: '%s', runtime: '%s') "
+                    "has supports_tools=False. Removed 'tools' and/or 'tool_choice' from request to %s.",
+                    internal_model_name, model_name_from_request, runtime_name_for_model, request.url.path
                 )
                 # Re-encode the modified body to body_bytes as it's used later for forwarding
-                body_bytes = json.dumps(body).encode('utf-8')
+                body_bytes = _json_dumps(body)
 
     # Check if the runner is already running using the internal_model_name
     # Note: The 'model_name' variable used from here onwards for runner management
@@ -218,171 +547,185 @@ async def _fetch_non_streaming_v1_response(
 
     if port is None:
         # Runner is not running, request startup and wait
-        logging.info(f"Runner for {model_name} not running. Requesting startup.")
+        logging.info("Runner for %s not running. Requesting startup.", model_name)
         startup_timeout = 240 # Define startup_timeout before the try block
+        startup_task = proxy_server._get_startup_task(model_name)
         try:
-            # Request startup via the callback, which returns an asyncio.Future
-            # Store the future locally in the proxy thread instance
-            if model_name not in proxy_server._runner_ready_futures or proxy_server._runner_ready_futures[model_name].done():
-                 logging.debug(f"Creating new startup future for {model_name}")
-                 proxy_server._runner_ready_futures[model_name] = asyncio.create_task(request_runner_start_callback(model_name))
-            else:
-                 logging.debug(f"Using existing startup future for {model_name}")
-
-            # Wait for the runner to become ready (Future to resolve)
-            # Use a timeout to prevent infinite waiting
-            port = await asyncio.wait_for(
-                proxy_server._runner_ready_futures[model_name],
-                timeout=startup_timeout
-            )
-            logging.info(f"Runner for {model_name} is ready on port {port} after startup.")
+            # Wait for the runner to become ready. The task is shared with any other
+            # request for this model, so only this request's wait is bounded and
+            # cancelled, never the startup itself.
+            port = await asyncio.wait_for(asyncio.shield(startup_task), timeout=startup_timeout)
+            logging.info("Runner for %s is ready on port %s after startup.", model_name, port)
 
         except asyncio.TimeoutError:
-            logging.error(f"Timeout waiting for runner {model_name} to start after {startup_timeout} seconds.")
-            # Clean up the future if it timed out
-            if model_name in proxy_server._runner_ready_futures and not proxy_server._runner_ready_futures[model_name].done():
-                 proxy_server._runner_ready_futures[model_name].cancel()
-                 del proxy_server._runner_ready_futures[model_name]
-            return {"error": {"message": f"Timeout starting runner for model '{model_name}'.", "type": "runner_startup_error"}}
+            logging.error("Timeout waiting for runner %s to start after %s seconds.", model_name, startup_timeout)
+            raise _ForwardError(f"Timeout starting runner for model '{model_name}'.", "runner_startup_error")
         except Exception as e:
-            logging.error(f"Error during runner startup for {model_name}: {e}\n{traceback.format_exc()}")
-            if model_name in proxy_server._runner_ready_futures and not proxy_server._runner_ready_futures[model_name].done():
-                 proxy_server._runner_ready_futures[model_name].set_exception(e)
-                 del proxy_server._runner_ready_futures[model_name]
-            return {"error": {"message": f"Error starting runner for model '{model_name}': {e}", "type": "runner_startup_error"}}
+            logging.error("Error during runner startup for %s: %s", model_name, e, exc_info=True)
+            raise _ForwardError(f"Error starting runner for model '{model_name}': {e}", "runner_startup_error")
 
     else:
-        logging.debug(f"Runner for {model_name} is already running on port {port}.")
-        # If it was running, ensure its future is marked as done with the port
-        # This handles cases where the proxy restarts but the runner is still alive
-        if model_name not in proxy_server._runner_ready_futures or not proxy_server._runner_ready_futures[model_name].done():
-             logging.debug(f"Creating completed future for already running runner {model_name}")
-             future = asyncio.Future()
-             future.set_result(port)
-             proxy_server._runner_ready_futures[model_name] = future
-             # No need for timer cleanup here, as it's already running.
-             # The future will be removed if the runner stops later.
-
-
-    # Runner is ready and port is known. Forward the request.
+        logging.debug("Runner for %s is already running on port %s.", model_name, port)
+
+    # Runner is ready and port is known.
     # Construct the target URL using the known port and the provided target_path or original request path
     path_to_use = target_path if target_path is not None else request.url.path
     target_url = f"http://127.0.0.1:{port}{path_to_use}"
-    logging.debug(f"Target URL: {target_url}")
-    logging.debug(f"Forwarding request for {model_name} to {target_url}")
+    logging.debug("Target URL: %s", target_url)
+
+    return _ForwardPlan(
+        model_name=model_name,
+        model_name_from_request=model_name_from_request,
+        port=port,
+        target_url=target_url,
+        body_bytes=body_bytes,
+        system_fingerprint=runtime_info.system_fingerprint,
+    )
+
+
+# --- New function for non-streaming responses ---
+async def _fetch_non_streaming_v1_response(
+    request: Request,
+    target_path: Optional[str],
+    body: Any,
+    body_bytes: bytes
+) -> Dict[str, Any] | list[Any] | Response:
+    """
+    Handles non-streaming /v1/* requests. It ensures the target runner is running,
+    forwards the request, and returns the complete response as a dictionary.
+    A successful runner response that already carries a system_fingerprint is
+    returned unparsed, as a ready-made Response.
+    """
+    state = request.app.state
+    try:
+        plan = await _prepare_forward(request, target_path, body, body_bytes)
+    except _ForwardError as e:
+        return e.payload
+
+    prompt_logging_enabled = getattr(state, 'prompt_logging_enabled', False)
+    model_name = plan.model_name
+    model_name_from_request = plan.model_name_from_request
+    port = plan.port
+    target_url = plan.target_url
+    body_bytes = plan.body_bytes
+    logging.debug("Forwarding request for %s to %s", model_name, target_url)
 
     # Use httpx to forward the request and yield chunks directly
-    async with httpx.AsyncClient() as client:
-        response_chunks = [] # Buffer for response chunks
-        try:
-            # Reconstruct headers, removing host and potentially others that shouldn't be forwarded
-            headers = dict(request.headers)
-            headers.pop('host', None) # Remove host header
-            # Remove content-length header as httpx will set it correctly based on the forwarded content
-            headers.pop('content-length', None)
-            # Forward the request, including method, URL path, headers, and body
-            # Use the body_bytes read earlier
-            async with client.stream(
-                method=request.method,
-                url=target_url,
-                headers=headers,
-                content=body_bytes, # Pass the raw body bytes
-                timeout=600.0, # Use a generous timeout for model responses
-            ) as proxy_response:
-
-                # Check if the response is streaming (e.g., Server-Sent Events)
-                # This requires inspecting headers like 'content-type'
-                content_type = proxy_response.headers.get('content-type', '').lower()
-                is_backend_streaming = 'text/event-stream' in content_type
-
-                config = request.app.state.all_models_config
-                model_config_for_fingerprint = config.get(model_name, {})
-                system_fingerprint = calculate_system_fingerprint(model_config_for_fingerprint)
-
-                if is_backend_streaming:
-                    logging.debug(f"Collecting streaming response from {target_url} for non-streaming client (SSE -> Full)")
-                    # collected_data_chunks = [] # F841: local variable 'collected_data_chunks' is assigned to but never used
-                    final_response_obj = {"id": "chatcmpl-default", "object": "chat.completion", "created": int(asyncio.get_event_loop().time()), "model": model_name_from_request, "choices": []}
-                    current_choice = {"index": 0, "message": {"role": "assistant", "content": ""}, "finish_reason": None}
-                    has_content = False
-
-                    async for chunk in proxy_response.aiter_bytes():
-                        if prompt_logging_enabled:
-                            response_chunks.append(chunk)
-                        chunk_str = chunk.decode('utf-8').strip()
-                        if chunk_str.startswith('data: '):
-                            json_payload_str = chunk_str[len('data: '):].strip()
-                            if json_payload_str == '[DONE]':
-                                break
-                            try:
-                                data_json = json.loads(json_payload_str)
-                                if data_json.get("choices"):
-                                    delta = data_json["choices"][0].get("delta", {})
-                                    if "content" in delta and delta["content"] is not None:
-                                        current_choice["message"]["content"] += delta["content"]
-                                        has_content = True
-                                    if data_json["choices"][0].get("finish_reason"):
-                                        current_choice["finish_reason"] = data_json["choices"][0]["finish_reason"]
-                            except json.JSONDecodeError:
-                                logging.warning(f"Could not decode JSON from streaming chunk for non-streaming client: {json_payload_str}")
-
-                    if has_content or current_choice["finish_reason"]:
-                        final_response_obj["choices"].append(current_choice)
-
-                    if 'system_fingerprint' not in final_response_obj:
-                        final_response_obj['system_fingerprint'] = system_fingerprint
-
-                    return final_response_obj
-                else: # Backend is not streaming, client wants full (ideal case for non-streaming)
-                    logging.debug(f"Forwarding non-streaming response from {target_url} to non-streaming client (Full -> Full)")
-                    response_body = await proxy_response.aread()
-                    if prompt_logging_enabled:
-                        response_chunks.append(response_body)
-                    try:
-                        response_json = json.loads(response_body.decode('utf-8'))
-                        if (not isinstance(response_json, list)) and 'system_fingerprint' not in response_json:
-                            response_json['system_fingerprint'] = system_fingerprint
-
-                        if proxy_response.status_code != 200:
-                            logging.error(f"Error response from {target_url}: {proxy_response.status_code} - {response_json}")
-                            return response_json
+    client = state.http_client
+    # Tail of the response for prompt logging, only kept when that is enabled
+    response_log = _ResponseLogBuffer() if prompt_logging_enabled else None
+    try:
+        # Forward only the headers the runner cares about, as the raw bytes pairs
+        headers = [(k, v) for k, v in request.headers.raw if k in _FORWARD_HEADERS]
+        # Forward the request, including method, URL path, headers, and body
+        # Use the body_bytes read earlier
+        async with client.stream(
+            method=request.method,
+            url=target_url,
+            headers=headers,
+            content=body_bytes, # Pass the raw body bytes
+            timeout=600.0, # Use a generous timeout for model responses
+        ) as proxy_response:
+
+            # Check if the response is streaming (e.g., Server-Sent Events)
+            # This requires inspecting headers like 'content-type'
+            content_type = proxy_response.headers.get('content-type', '').lower()
+            is_backend_streaming = 'text/event-stream' in content_type
+
+            system_fingerprint = plan.system_fingerprint
+
+            if is_backend_streaming:
+                logging.debug("Collecting streaming response from %s for non-streaming client (SSE -> Full)", target_url)
+                # collected_data_chunks = [] # F841: local variable 'collected_data_chunks' is assigned to but never used
+                final_response_obj = {"id": "chatcmpl-default", "object": "chat.completion", "created": int(time.time()), "model": model_name_from_request, "choices": []}
+                current_choice = {"index": 0, "message": {"role": "assistant", "content": ""}, "finish_reason": None}
+                # Content deltas are joined once at the end instead of growing
+                # a string with every chunk.
+                content_parts = []
+                # Module globals used per event, bound once for the loop
+                json_loads, sse_event_data, sse_suffix = _json_loads, _sse_event_data, _SSE_SUFFIX
+
+                async for event in _iter_sse_events(proxy_response.aiter_bytes()):
+                    if response_log is not None:
+                        response_log.append(event + sse_suffix)
+                    json_payload = sse_event_data(event)
+                    if json_payload is not None:
+                        if json_payload == b'[DONE]':
+                            break
+                        try:
+                            data_json = json_loads(json_payload)
+                            if data_json.get("choices"):
+                                delta = data_json["choices"][0].get("delta", {})
+                                if "content" in delta and delta["content"] is not None:
+                                    content_parts.append(delta["content"])
+                                if data_json["choices"][0].get("finish_reason"):
+                                    current_choice["finish_reason"] = data_json["choices"][0]["finish_reason"]
+                        except json.JSONDecodeError:
+                            logging.warning("Could not decode JSON from streaming chunk for non-streaming client: %s", json_payload.decode('utf-8', errors='replace'))
+
+                current_choice["message"]["content"] = "".join(content_parts)
+                if content_parts or current_choice["finish_reason"]:
+                    final_response_obj["choices"].append(current_choice)
+
+                if 'system_fingerprint' not in final_response_obj:
+                    final_response_obj['system_fingerprint'] = system_fingerprint
+
+                return final_response_obj
+            else: # Backend is not streaming, client wants full (ideal case for non-streaming)
+                logging.debug("Forwarding non-streaming response from %s to non-streaming client (Full -> Full)", target_url)
+                response_body = await proxy_response.aread()
+                if response_log is not None:
+                    response_log.append(response_body)
+                # Nothing to add to a successful object response that already has a
+                # fingerprint, so pass the runner's bytes through without
+                # re-serializing them. A nested key also matches the probe, so
+                # the body is parsed to confirm the key is at the top level.
+                if (proxy_response.status_code == 200
+                        and response_body.lstrip().startswith(b'{')
+                        and _json_has_fingerprint(response_body)):
+                    return Response(content=response_body, media_type='application/json')
+                try:
+                    response_json = _json_loads(response_body)
+                    if (not isinstance(response_json, list)) and 'system_fingerprint' not in response_json:
+                        response_json['system_fingerprint'] = system_fingerprint
+
+                    if proxy_response.status_code != 200:
+                        logging.error("Error response from %s: %s - %s", target_url, proxy_response.status_code, response_json)
                         return response_json
-                    except json.JSONDecodeError:
-                        logging.warning(f"Could not decode JSON from runner response for non-streaming client: {response_body.decode('utf-8')}")
-                        return {"error": {"message": "Runner returned non-JSON response.", "type": "runner_error", "details": response_body.decode('utf-8', errors='replace')[:500]}}
-
-        except httpx.RequestError as e:
-            logging.error(f"Error forwarding request to runner {model_name} on port {port}: {e}\n{traceback.format_exc()}")
-            error_payload = {"error": {"message": f"Error communicating with runner for model '{model_name}': {e}", "type": "runner_communication_error"}}
-            if prompt_logging_enabled:
-                 prompts_logger.error(f"Error response from {target_url} for model '{model_name}': {e}")
-            return error_payload
-
-        except asyncio.TimeoutError as e:
-            logging.error(f"Timeout during request forwarding for {model_name} to {target_url}: {e}\n{traceback.format_exc()}")
-            error_payload = {"error": {"message": f"Timeout processing request for model '{model_name}'.", "type": "request_timeout_error"}}
-            if prompt_logging_enabled:
-                 prompts_logger.error(f"Timeout processing request for model '{model_name}': {e}")
-            return error_payload
+                    return response_json
+                except json.JSONDecodeError:
+                    logging.warning("Could not decode JSON from runner response for non-streaming client: %s", response_body.decode('utf-8', errors='replace'))
+                    return {"error": {"message": "Runner returned non-JSON response.", "type": "runner_error", "details": response_body[:500].decode('utf-8', errors='replace')}}
+
+    # Connection failures and timeouts are expected (runner stopped or
+    # restarting); their traceback says nothing the message does not.
+    except httpx.RequestError as e:
+        logging.error("Error forwarding request to runner %s on port %s: %s: %s", model_name, port, type(e).__name__, e)
+        error_payload = {"error": {"message": f"Error communicating with runner for model '{model_name}': {e}", "type": "runner_communication_error"}}
+        if prompt_logging_enabled:
+             _log_prompt(state, logging.ERROR, "Error response from %s for model '%s': %s", target_url, model_name, e)
+        return error_payload
 
-        except Exception as e:
-            logging.error(f"Unexpected error during request forwarding for {model_name}: {e}\n{traceback.format_exc()}")
-            error_payload = {"error": {"message": f"Internal error processing request for model '{model_name}': {e}", "type": "internal_error"}}
-            if prompt_logging_enabled:
-                 prompts_logger.error(f"Unexpected error processing request for model '{model_name}': {e}")
-            return error_payload
-        finally:
-            if prompt_logging_enabled and response_chunks:
-                 try:
-                     full_response_bytes = b''.join(response_chunks)
-                     try:
-                         full_response_json = json.loads(full_response_bytes.decode('utf-8'))
-                         prompts_logger.info(f"Response from {target_url} for model '{model_name}': {json.dumps(full_response_json)}")
-                     except json.JSONDecodeError:
-                         response_str = full_response_bytes.decode('utf-8', errors='replace')
-                         prompts_logger.info(f"Raw response from {target_url} for model '{model_name}': {response_str[:500]}...")
-                 except Exception as log_e:
-                     logging.error(f"Error logging response body for {request.url.path}: {log_e}")
+    except asyncio.TimeoutError as e:
+        logging.error("Timeout during request forwarding for %s to %s: %s", model_name, target_url, e)
+        error_payload = {"error": {"message": f"Timeout processing request for model '{model_name}'.", "type": "request_timeout_error"}}
+        if prompt_logging_enabled:
+             _log_prompt(state, logging.ERROR, "Timeout processing request for model '%s': %s", model_name, e)
+        return error_payload
+
+    except Exception as e:
+        logging.error("Unexpected error during request forwarding for %s: %s", model_name, e, exc_info=True)
+        error_payload = {"error": {"message": f"Internal error processing request for model '{model_name}': {e}", "type": "internal_error"}}
+        if prompt_logging_enabled:
+             _log_prompt(state, logging.ERROR, "Unexpected error processing request for model '%s': %s", model_name, e)
+        return error_payload
+    finally:
+        if response_log:
+             try:
+                 # Logged as received; a truncated tail is not valid JSON anyway.
+                 _log_prompt(state, logging.INFO, "Response from %s for model '%s'%s: %s", target_url, model_name, " (truncated)" if response_log.truncated else "", response_log.data())
+             except Exception as log_e:
+                 logging.error("Error logging response body for %s: %s", request.url.path, log_e)
 
 # --- End of _fetch_non_streaming_v1_response ---
 
@@ -390,375 +733,251 @@ async def _fetch_non_streaming_v1_response(
 # --- Modified generator for streaming responses ONLY ---
 async def _dynamic_route_v1_request_generator(
     request: Request,
-    target_path: Optional[str] = None,
-    body: Optional[dict] = None,
-    body_bytes: Optional[bytes] = None
+    target_path: Optional[str],
+    body: Any,
+    body_bytes: bytes
 ) -> AsyncGenerator[bytes, None]: # Explicitly an AsyncGenerator
     """
     Intercepts /v1/* requests, ensures the target runner is running,
     and forwards the request to the runner's port, yielding the response chunks.
     This function ONLY handles streaming responses.
     """
-    all_models_config = request.app.state.all_models_config
-    runtimes_config = request.app.state.runtimes_config
-    get_runner_port_callback = request.app.state.get_runner_port_callback
-    request_runner_start_callback = request.app.state.request_runner_start_callback
-    prompt_logging_enabled = getattr(request.app.state, 'prompt_logging_enabled', False)
-    prompts_logger = getattr(request.app.state, 'prompts_logger', logging.getLogger())
-    proxy_thread_instance = getattr(request.app.state, 'proxy_thread_instance', None)
-
-    if not proxy_thread_instance:
-        logging.error("proxy_thread_instance not found in app.state")
-        error_payload = {"error": {"message": "Internal server error: Proxy not configured.", "type": "internal_error"}}
-        yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
+    state = request.app.state
+    try:
+        plan = await _prepare_forward(request, target_path, body, body_bytes)
+    except _ForwardError as e:
+        frame = _STATIC_SSE_ERROR_FRAMES.get(str(e))
+        yield frame if frame is not None else _SSE_PREFIX + _json_dumps(e.payload) + _SSE_SUFFIX
         return
-    # The instance is the LMStudioProxyServer itself.
-    proxy_server = proxy_thread_instance
 
+    prompt_logging_enabled = getattr(state, 'prompt_logging_enabled', False)
+    model_name = plan.model_name
+    target_url = plan.target_url
+    body_bytes = plan.body_bytes
+    logging.debug("Streaming: Target URL: %s", target_url)
+
+    client = state.http_client
+    response_log = _ResponseLogBuffer() if prompt_logging_enabled else None
     try:
-        if body is None or body_bytes is None:
-            body_bytes = await request.body()
-            body = {}
-            if body_bytes:
+        headers = [(k, v) for k, v in request.headers.raw if k in _FORWARD_HEADERS]
+
+        async with client.stream(
+            method=request.method, url=target_url, headers=headers, content=body_bytes, timeout=600.0
+        ) as proxy_response:
+            content_type = proxy_response.headers.get('content-type', '').lower()
+            is_backend_streaming = 'text/event-stream' in content_type
+            system_fingerprint = plan.system_fingerprint
+
+            if is_backend_streaming:
+                logging.debug("Streaming response from %s to client (SSE -> SSE)", target_url)
+                sse_suffix, fingerprint_key = _SSE_SUFFIX, _FINGERPRINT_KEY
+                fingerprinted = _sse_fingerprinter(system_fingerprint)
+
+                # aiter_bytes() without a chunk_size hands over each read as it
+                # arrives (httpcore already reads up to 64 KiB at a time). A
+                # chunk_size would hold tokens back until that many bytes have
+                # accumulated, and aiter_raw() would skip content decoding.
+                chunks = proxy_response.aiter_bytes()
+                splitter = _SSEEventSplitter()
+                # Set once an event arrives that the runner fingerprinted itself
+                # (llama.cpp does this for every chunk). From then on nothing
+                # needs rewriting and the stream is relayed as received. The
+                # probe alone is not enough to switch, since it also matches a
+                # nested key, so the matching event is parsed to confirm.
+                runner_fingerprints = False
+                async for chunk in chunks:
+                    # All frames completed by one read go out as one write, so a
+                    # read carrying several events costs a single ASGI send.
+                    # Nothing is held back waiting for more data.
+                    frames = []
+                    for event in splitter.feed(chunk):
+                        if runner_fingerprints or (fingerprint_key in event and _sse_event_has_fingerprint(event)):
+                            runner_fingerprints = True
+                            frames.append(event + sse_suffix)
+                        else:
+                            frames.append(fingerprinted(event))
+                        if response_log is not None:
+                            response_log.append(event + sse_suffix)
+                    if runner_fingerprints:
+                        tail = splitter.pending()
+                        if response_log is not None:
+                            response_log.append(tail)
+                        frames.append(tail)
+                        yield b''.join(frames)
+                        break
+                    if frames:
+                        yield frames[0] if len(frames) == 1 else b''.join(frames)
+                tail = splitter.pending()
+                if runner_fingerprints:
+                    async for chunk in chunks:
+                        if response_log is not None:
+                            response_log.append(chunk)
+                        yield chunk
+                elif tail.strip():
+                    # The last event may lack its blank line; it gets the same
+                    # check as the others so a fingerprint is not added twice.
+                    if response_log is not None:
+                        response_log.append(tail + sse_suffix)
+                    if fingerprint_key in tail and _sse_event_has_fingerprint(tail):
+                        yield tail + sse_suffix
+                    else:
+                        yield fingerprinted(tail)
+            else: # Backend is not streaming, but client wants stream
+                logging.debug("Streaming response from %s to client (Full -> SSE)", target_url)
+                response_body = await proxy_response.aread()
+                if response_log is not None:
+                    response_log.append(response_body)
+                # A successful single-line object body that already has a
+                # fingerprint at its top level fits in one SSE frame as it is.
+                stripped_body = response_body.strip()
+                if (proxy_response.status_code == 200
+                        and stripped_body.startswith(b'{')
+                        and b'\n' not in stripped_body
+                        and _json_has_fingerprint(stripped_body)):
+                    yield _SSE_PREFIX + stripped_body + _SSE_SUFFIX
+                    yield _SSE_DONE
+                    return
                 try:
-                    body = json.loads(body_bytes)
+                    response_json = _json_loads(response_body)
+                    if 'system_fingerprint' not in response_json:
+                        response_json['system_fingerprint'] = system_fingerprint
+                    yield _SSE_PREFIX + _json_dumps(response_json) + _SSE_SUFFIX
                 except json.JSONDecodeError:
-                    body = None
-                    logging.warning(f"Could not decode request body as JSON for {request.url.path}")
-                    error_payload = {"error": {"message": "Invalid JSON request body.", "type": "invalid_request_error"}}
-                    yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
-                    return
-
-        model_name_from_request = None
-        if isinstance(body, dict):
-            model_name_from_request = body.get("model")
-
-        if not model_name_from_request:
-            logging.warning(f"Model name not found in request body for {request.url.path}")
-            error_payload = {"error": {"message": "Model name not specified in request body.", "type": "invalid_request_error"}}
-            yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
-            return
+                    logging.warning("Could not decode non-streaming backend response as JSON. Yielding raw. Status: %s", proxy_response.status_code)
+                    yield _SSE_PREFIX + response_body + _SSE_SUFFIX
+                yield _SSE_DONE
 
+    except httpx.RequestError as e:
+        logging.error("Error forwarding stream to runner %s: %s: %s", model_name, type(e).__name__, e)
+        error_payload = {"error": {"message": f"Error communicating with runner for model '{model_name}': {e}", "type": "runner_communication_error"}}
         if prompt_logging_enabled:
-            try:
-                prompts_logger.info(f"Request to {request.url.path} for model '{model_name_from_request}': {json.dumps(body)}")
-            except Exception as log_e:
-                logging.error(f"Error logging request body for {request.url.path}: {log_e}")
-
-    except Exception as e:
-        logging.error(f"Error reading request body or extracting model name: {e}\n{traceback.format_exc()}")
-        error_payload = {"error": {"message": f"Invalid request: {e}", "type": "invalid_request_error"}}
-        yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
+             _log_prompt(state, logging.ERROR, "Error response from %s for model '%s': %s", target_url, model_name, e)
+        yield _SSE_PREFIX + _json_dumps(error_payload) + _SSE_SUFFIX
         return
-
-    id_to_internal_name_mapping = {v: k for k, v in gguf_metadata.get_model_name_to_id_mapping(all_models_config).items()}
-    internal_model_name = id_to_internal_name_mapping.get(model_name_from_request)
-
-    if not internal_model_name:
-        if model_name_from_request in all_models_config:
-            internal_model_name = model_name_from_request
-            logging.warning(f"Request model ID '{model_name_from_request}' matched an internal model name directly.")
-        else:
-            logging.warning(f"Request for unknown model ID: {model_name_from_request}.")
-            error_payload = {"error": {"message": f"Model ID '{model_name_from_request}' not found in configuration mapping.", "type": "invalid_request_error"}}
-            yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
-            return
-
-    model_config_details = all_models_config.get(internal_model_name)
-    runtime_name_for_model = model_config_details.get("llama_cpp_runtime") if model_config_details else None
-
-    if not runtime_name_for_model:
-        logging.warning(f"Runtime not defined for model '{internal_model_name}'.")
-        error_payload = {"error": {"message": f"Runtime not configured for model '{internal_model_name}'.", "type": "configuration_error"}}
-        yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
+    except asyncio.TimeoutError as e:
+        logging.error("Timeout during stream forwarding for %s: %s", model_name, e)
+        error_payload = {"error": {"message": f"Timeout processing stream for model '{model_name}'.", "type": "request_timeout_error"}}
+        if prompt_logging_enabled:
+             _log_prompt(state, logging.ERROR, "Timeout processing stream for model '%s': %s", model_name, e)
+        yield _SSE_PREFIX + _json_dumps(error_payload) + _SSE_SUFFIX
         return
-
-    runtime_details_from_config = runtimes_config.get(runtime_name_for_model)
-    if not runtime_details_from_config:
-        logging.warning(f"Configuration for runtime '{runtime_name_for_model}' not found.")
-        error_payload = {"error": {"message": f"Configuration for runtime '{runtime_name_for_model}' not found.", "type": "configuration_error"}}
-        yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
+    except Exception as e:
+        logging.error("Unexpected error during stream forwarding for %s: %s", model_name, e, exc_info=True)
+        error_payload = {"error": {"message": f"Internal error processing stream for model '{model_name}': {e}", "type": "internal_error"}}
+        if prompt_logging_enabled:
+             _log_prompt(state, logging.ERROR, "Unexpected error processing stream for model '%s': %s", model_name, e)
+        yield _SSE_PREFIX + _json_dumps(error_payload) + _SSE_SUFFIX
         return
+    finally:
+        if response_log:
+             try:
+                 _log_prompt(state, logging.INFO, "Streamed response from %s for model '%s'%s: %s", target_url, model_name, " (truncated)" if response_log.truncated else "", response_log.data())
+             except Exception as log_e:
+                 logging.error("Error logging streamed response body for %s: %s", request.url.path, log_e)
 
-    if body_bytes and body:
-        if runtime_details_from_config.get("supports_tools") is False:
-            if "tools" in body or "tool_choice" in body:
-                body.pop("tools", None)
-                body.pop("tool_choice", None)
-                logging.info(f"Model '{internal_model_name}' has supports_tools=False. Removed 'tools'/'tool_choice'.")
-                body_bytes = json.dumps(body).encode('utf-8')
+# --- End of _dynamic_route_v1_request_generator ---
 
-    model_name = internal_model_name
-    port = get_runner_port_callback(model_name)
 
-    if port is None:
-        logging.info(f"Runner for {model_name} not running. Requesting startup.")
-        startup_timeout = 240
-        try:
-            if model_name not in proxy_server._runner_ready_futures or proxy_server._runner_ready_futures[model_name].done():
-                 proxy_server._runner_ready_futures[model_name] = asyncio.create_task(request_runner_start_callback(model_name))
-
-            port = await asyncio.wait_for(proxy_server._runner_ready_futures[model_name], timeout=startup_timeout)
-            logging.info(f"Runner for {model_name} is ready on port {port} after startup.")
-        except asyncio.TimeoutError:
-            logging.error(f"Timeout waiting for runner {model_name} to start.")
-            if model_name in proxy_server._runner_ready_futures and not proxy_server._runner_ready_futures[model_name].done():
-                 proxy_server._runner_ready_futures[model_name].cancel()
-                 del proxy_server._runner_ready_futures[model_name]
-            error_payload = {"error": {"message": f"Timeout starting runner for model '{model_name}'.", "type": "runner_startup_error"}}
-            yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
-            return
-        except Exception as e:
-            logging.error(f"Error during runner startup for {model_name}: {e}\n{traceback.format_exc()}")
-            if model_name in proxy_server._runner_ready_futures and not proxy_server._runner_ready_futures[model_name].done():
-                 proxy_server._runner_ready_futures[model_name].set_exception(e)
-                 del proxy_server._runner_ready_futures[model_name]
-            error_payload = {"error": {"message": f"Error starting runner for model '{model_name}': {e}", "type": "runner_startup_error"}}
-            yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
-            return
-    else:
-        logging.debug(f"Runner for {model_name} is already running on port {port}.")
-        if model_name not in proxy_server._runner_ready_futures or not proxy_server._runner_ready_futures[model_name].done():
-             future = asyncio.Future()
-             future.set_result(port)
-             proxy_server._runner_ready_futures[model_name] = future
-
-    path_to_use = target_path if target_path is not None else request.url.path
-    target_url = f"http://127.0.0.1:{port}{path_to_use}"
-    logging.debug(f"Streaming: Target URL: {target_url}")
+# Status code for each error type the forwarding helpers report; any other
+# type is a server error.
+_ERROR_STATUS = {
+    "invalid_request_error": status.HTTP_400_BAD_REQUEST,
+    "runner_startup_error": status.HTTP_503_SERVICE_UNAVAILABLE,
+    "runner_communication_error": status.HTTP_503_SERVICE_UNAVAILABLE,
+}
+
+
+def _embeddings_list_response(response_data: list, body: Dict[str, Any]) -> Response:
+    """Converts the runner's list-shaped embeddings reply into an OpenAI embeddings list."""
+    # If the response is a list, we expect it to be in the LM Studio format
+    embedding_obj = response_data[0]
+    if not isinstance(embedding_obj, dict):
+        logging.error("Non-streaming /v1/embeddings request returned a list with non-dict items: %s", response_data)
+        return FastJSONResponse(content={"error": {"message": "Invalid response type for embeddings.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Check if it has the expected structure for embeddings
+    if 'embedding' not in embedding_obj:
+        logging.error("Non-streaming /v1/embeddings request returned an invalid object structure: %s", embedding_obj)
+        return FastJSONResponse(content={"error": {"message": "Invalid response structure for embeddings.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    embedding_arr = embedding_obj.get('embedding')
+    if not isinstance(embedding_arr, list) or len(embedding_arr) == 0:
+        logging.error("Non-streaming /v1/embeddings request returned an invalid embedding array: %s", embedding_arr)
+        return FastJSONResponse(content={"error": {"message": "Invalid embedding data format.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
+    # Create one embedding object per vector in the array
+    embedding_objects = [
+        {
+            "object": "embedding",
+            "index": index,
+            "embedding": vector,
+        }
+        for index, vector in enumerate(embedding_arr)
+    ]
+    return FastJSONResponse(content={
+        "object": "list",
+        "data": embedding_objects,
+        "model": body.get("model", "unknown_model"),
+        "usage": {
+            "prompt_tokens": 0,
+            "total_tokens": 0
+        }
+    })
+
+
+def _make_proxy_handler(
+    target_path: Optional[str] = None,
+    allow_stream: bool = True,
+    post_process: Optional[Callable[[list, Dict[str, Any]], Response]] = None,
+):
+    """
+    Builds the handler for a proxied POST endpoint.
 
-    async with httpx.AsyncClient() as client:
-        response_chunks = []
+    The request is forwarded to target_path on the model's runner, or to its own
+    path when target_path is None. With allow_stream the client's "stream" flag
+    selects the SSE generator. post_process, if given, turns a list-shaped
+    runner reply into the client response; otherwise only dicts are expected.
+    """
+    async def handler(request: Request):
+        if target_path is not None and logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Proxying %s to %s", request.url.path, target_path)
         try:
-            headers = dict(request.headers)
-            headers.pop('host', None)
-            headers.pop('content-length', None)
-
-            async with client.stream(
-                method=request.method, url=target_url, headers=headers, content=body_bytes, timeout=600.0
-            ) as proxy_response:
-                content_type = proxy_response.headers.get('content-type', '').lower()
-                is_backend_streaming = 'text/event-stream' in content_type
-                config = request.app.state.all_models_config
-                model_config_for_fingerprint = config.get(model_name, {})
-                system_fingerprint = calculate_system_fingerprint(model_config_for_fingerprint)
-
-                if is_backend_streaming:
-                    logging.debug(f"Streaming response from {target_url} to client (SSE -> SSE)")
-                    async for chunk in proxy_response.aiter_bytes():
-                        if prompt_logging_enabled:
-                            response_chunks.append(chunk)
-                        try:
-                            chunk_str = chunk.decode('utf-8').strip()
-                            if chunk_str.startswith('data: '):
-                                json_payload_str = chunk_str[len('data: '):].strip()
-                                if json_payload_str == '[DONE]':
-                                    yield chunk
-                                    continue
-                                try:
-                                    data_json = json.loads(json_payload_str)
-                                    if 'system_fingerprint' not in data_json:
-                                        data_json['system_fingerprint'] = system_fingerprint
-                                        modified_chunk_str = f'data: {json.dumps(data_json)}\n\n'
-                                        yield modified_chunk_str.encode('utf-8')
-                                    else:
-                                        yield chunk
-                                except json.JSONDecodeError:
-                                    logging.warning(f"Could not decode JSON from streaming chunk: {json_payload_str}")
-                                    yield chunk
-                            else:
-                                yield chunk
-                        except Exception as e: # pylint: disable=broad-except
-                            logging.error(f"Error processing streaming chunk: {e}\n{traceback.format_exc()}")
-                            yield chunk
-                else: # Backend is not streaming, but client wants stream
-                    logging.debug(f"Streaming response from {target_url} to client (Full -> SSE)")
-                    response_body = await proxy_response.aread()
-                    if prompt_logging_enabled:
-                        response_chunks.append(response_body)
-                    try:
-                        response_json = json.loads(response_body.decode('utf-8'))
-                        if 'system_fingerprint' not in response_json:
-                            response_json['system_fingerprint'] = system_fingerprint
-                        yield f'data: {json.dumps(response_json)}\n\n'.encode('utf-8')
-                    except json.JSONDecodeError:
-                        logging.warning(f"Could not decode non-streaming backend response as JSON. Yielding raw. Status: {proxy_response.status_code}")
-                        yield f'data: {response_body.decode("utf-8", errors="replace")}\n\n'.encode('utf-8')
-                    yield 'data: [DONE]\n\n'.encode('utf-8')
-
-        except httpx.RequestError as e:
-            logging.error(f"Error forwarding stream to runner {model_name}: {e}\n{traceback.format_exc()}")
-            error_payload = {"error": {"message": f"Error communicating with runner for model '{model_name}': {e}", "type": "runner_communication_error"}}
-            if prompt_logging_enabled:
-                 prompts_logger.error(f"Error response from {target_url} for model '{model_name}': {e}")
-            yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
-            return
-        except asyncio.TimeoutError as e:
-            logging.error(f"Timeout during stream forwarding for {model_name}: {e}\n{traceback.format_exc()}")
-            error_payload = {"error": {"message": f"Timeout processing stream for model '{model_name}'.", "type": "request_timeout_error"}}
-            if prompt_logging_enabled:
-                 prompts_logger.error(f"Timeout processing stream for model '{model_name}': {e}")
-            yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
-            return
-        except Exception as e:
-            logging.error(f"Unexpected error during stream forwarding for {model_name}: {e}\n{traceback.format_exc()}")
-            error_payload = {"error": {"message": f"Internal error processing stream for model '{model_name}': {e}", "type": "internal_error"}}
-            if prompt_logging_enabled:
-                 prompts_logger.error(f"Unexpected error processing stream for model '{model_name}': {e}")
-            yield f'data: {json.dumps(error_payload)}\n\n'.encode('utf-8')
-            return
-        finally:
-            if prompt_logging_enabled and response_chunks:
-                 try:
-                     full_response_bytes = b''.join(response_chunks)
-                     try:
-                         full_response_json = json.loads(full_response_bytes.decode('utf-8'))
-                         prompts_logger.info(f"Streamed response from {target_url} for model '{model_name}': {json.dumps(full_response_json)}")
-                     except json.JSONDecodeError:
-                         response_str = full_response_bytes.decode('utf-8', errors='replace')
-                         prompts_logger.info(f"Raw streamed response from {target_url} for model '{model_name}': {response_str[:500]}...")
-                 except Exception as log_e:
-                     logging.error(f"Error logging streamed response body for {request.url.path}: {log_e}")
-
-# --- End of _dynamic_route_v1_request_generator ---
+            body_bytes = await request.body()
+            body_json = _json_loads(body_bytes) if body_bytes else {}
 
+            if allow_stream and body_json.get("stream", False):
+                return StreamingResponse(content=_dynamic_route_v1_request_generator(
+                    request, target_path=target_path, body=body_json, body_bytes=body_bytes
+                ))
 
-# --- Handlers for /api/v0/* proxying ---
-@app.post("/api/v0/chat/completions")
-async def _proxy_v0_chat_completions(request: Request):
-    """Proxies /api/v0/chat/completions to /v1/chat/completions."""
-    # logging.debug(f"Proxying /api/v0/chat/completions to /v1/chat/completions") # F541
-    logging.debug("Proxying /api/v0/chat/completions to /v1/chat/completions")
-    target_v1_path = "/v1/chat/completions"
-    try:
-        body_bytes = await request.body()
-        body_json = {}
-        if body_bytes:
-            body_json = json.loads(body_bytes)
-
-        client_requests_stream = body_json.get("stream", False)
-
-        if client_requests_stream:
-            return StreamingResponse(content=_dynamic_route_v1_request_generator(
-                request,
-                target_path=target_v1_path,
-                body=body_json,
-                body_bytes=body_bytes
-            ))
-        else:
             response_data = await _fetch_non_streaming_v1_response(
-                request,
-                target_path=target_v1_path,
-                body=body_json,
-                body_bytes=body_bytes
+                request, target_path=target_path, body=body_json, body_bytes=body_bytes
             )
+            if isinstance(response_data, Response):
+                return response_data
             if isinstance(response_data, dict):
                 if "error" in response_data:
                     error_type = response_data.get("error", {}).get("type", "unknown_error")
-                    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-                    if error_type == "invalid_request_error":
-                        status_code = status.HTTP_400_BAD_REQUEST
-                    elif error_type == "runner_startup_error" or error_type == "runner_communication_error":
-                        status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-                    return JSONResponse(content=response_data, status_code=status_code)
-                return JSONResponse(content=response_data)
-            else:
-                # This should ideally not be reached if _fetch_non_streaming_v1_response adheres to its contract
-                logging.error(f"Non-streaming APIv0 request to {target_v1_path} did not return a dict as expected.")
-                return JSONResponse(content={"error": {"message": "Internal server error: Invalid response type from processing function.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    except json.JSONDecodeError:
-        return JSONResponse(content={"error": {"message": "Invalid JSON in request body.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Error in {target_v1_path} handler: {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": {"message": f"Internal server error: {e}", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@app.post("/api/v0/embeddings")
-async def _proxy_v0_embeddings(request: Request):
-    """Proxies /api/v0/embeddings to /v1/embeddings. Embeddings are non-streaming."""
-    # logging.debug(f"Proxying /api/v0/embeddings to /v1/embeddings") # F541
-    logging.debug("Proxying /api/v0/embeddings to /v1/embeddings")
-    target_v1_path = "/embeddings"
-    try:
-        body_bytes = await request.body()
-        body_json = {}
-        if body_bytes:
-            body_json = json.loads(body_bytes)
-
-        # Embeddings are typically non-streaming.
-        response_data = await _fetch_non_streaming_v1_response(
-            request,
-            target_path=target_v1_path,
-            body=body_json,
-            body_bytes=body_bytes
-        )
-        if isinstance(response_data, dict):
-            if "error" in response_data:
-                error_type = response_data.get("error", {}).get("type", "unknown_error")
-                status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-                if error_type == "invalid_request_error":
-                    status_code = status.HTTP_400_BAD_REQUEST
-                elif error_type == "runner_startup_error" or error_type == "runner_communication_error":
-                    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-                return JSONResponse(content=response_data, status_code=status_code)
-            return JSONResponse(content=response_data)
-        else:
-            logging.error(f"Non-streaming APIv0 request to {target_v1_path} did not return a dict as expected.")
-            return JSONResponse(content={"error": {"message": "Internal server error: Invalid response type from processing function.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                    status_code = _ERROR_STATUS.get(error_type, status.HTTP_500_INTERNAL_SERVER_ERROR)
+                    return FastJSONResponse(content=response_data, status_code=status_code)
+                return FastJSONResponse(content=response_data)
+            if post_process is not None and isinstance(response_data, list):
+                return post_process(response_data, body_json)
+            # This should not be reached if _fetch_non_streaming_v1_response adheres to its contract
+            logging.error("Non-streaming request to %s did not return a dict as expected: %s", request.url.path, type(response_data))
+            return FastJSONResponse(content={"error": {"message": "Internal server error: Invalid response type from processing function.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        except json.JSONDecodeError:
+            return FastJSONResponse(content={"error": {"message": "Invalid JSON in request body.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logging.error("Error in %s handler: %s", request.url.path, e, exc_info=True)
+            return FastJSONResponse(content={"error": {"message": f"Internal server error: {e}", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return handler
 
-    except json.JSONDecodeError:
-        return JSONResponse(content={"error": {"message": "Invalid JSON in request body.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Error in {target_v1_path} handler: {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": {"message": f"Internal server error: {e}", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@app.post("/api/v0/completions")
-async def _proxy_v0_completions(request: Request):
-    """Proxies /api/v0/completions to /v1/completions."""
-    # logging.debug(f"Proxying /api/v0/completions to /v1/completions") # F541
-    logging.debug("Proxying /api/v0/completions to /v1/completions")
-    target_v1_path = "/v1/completions"
-    try:
-        body_bytes = await request.body()
-        body_json = {}
-        if body_bytes:
-            body_json = json.loads(body_bytes)
-
-        client_requests_stream = body_json.get("stream", False)
-
-        if client_requests_stream:
-            return StreamingResponse(content=_dynamic_route_v1_request_generator(
-                request,
-                target_path=target_v1_path,
-                body=body_json,
-                body_bytes=body_bytes
-            ))
-        else:
-            response_data = await _fetch_non_streaming_v1_response(
-                request,
-                target_path=target_v1_path,
-                body=body_json,
-                body_bytes=body_bytes
-            )
-            if isinstance(response_data, dict):
-                if "error" in response_data:
-                    error_type = response_data.get("error", {}).get("type", "unknown_error")
-                    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-                    if error_type == "invalid_request_error":
-                        status_code = status.HTTP_400_BAD_REQUEST
-                    elif error_type == "runner_startup_error" or error_type == "runner_communication_error":
-                        status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-                    return JSONResponse(content=response_data, status_code=status_code)
-                return JSONResponse(content=response_data)
-            else:
-                logging.error(f"Non-streaming APIv0 request to {target_v1_path} did not return a dict as expected.")
-                return JSONResponse(content={"error": {"message": "Internal server error: Invalid response type from processing function.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    except json.JSONDecodeError:
-        return JSONResponse(content={"error": {"message": "Invalid JSON in request body.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Error in {target_v1_path} handler: {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": {"message": f"Internal server error: {e}", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+# --- Handlers for /api/v0/* proxying ---
+# Embeddings are non-streaming.
+app.post("/api/v0/chat/completions")(_make_proxy_handler("/v1/chat/completions"))
+app.post("/api/v0/embeddings")(_make_proxy_handler("/embeddings", allow_stream=False))
+app.post("/api/v0/completions")(_make_proxy_handler("/v1/completions"))
 
 # --- End handlers for /api/v0/* proxying ---
 
@@ -767,10 +986,16 @@ async def _proxy_v0_completions(request: Request):
 @app.get("/v1/models")
 async def _list_openai_models_handler(request: Request):
     """Handler for GET /v1/models, returns a simplified OpenAI-compatible list."""
+    state = request.app.state
+    # The list only depends on the configured models, so the rendered body is
+    # cached for the current all_models_config like the ID mappings.
+    all_models_config = state.all_models_config
+    cached = getattr(state, 'openai_models_response_cache', None)
+    if cached is not None and cached[0] is all_models_config:
+        return Response(content=cached[1], media_type='application/json')
     try:
-        all_models_config = request.app.state.all_models_config
         # Get the mapping from internal name to LM Studio ID
-        id_mapping = gguf_metadata.get_model_name_to_id_mapping(all_models_config)
+        id_mapping, _ = _get_model_id_mappings(state)
 
         # Create the list of models in OpenAI format
         models_list = []
@@ -781,12 +1006,14 @@ async def _list_openai_models_handler(request: Request):
                 "owned_by": "organization_owner" # Standard value for local models
             })
 
-        return JSONResponse(content={
+        response_body = _json_dumps({
             "object": "list",
             "data": models_list
         })
+        state.openai_models_response_cache = (all_models_config, response_body)
+        return Response(content=response_body, media_type='application/json')
     except Exception as e:
-        logging.error(f"Error handling /v1/models: {e}\n{traceback.format_exc()}")
+        logging.error("Error handling /v1/models: %s", e, exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error retrieving models list")
 
 # --- End handler for /v1/models ---
@@ -827,153 +1054,9 @@ for route in app.routes:
         current_v1_handlers[route.path] = route.endpoint
 
 # Add routes using the @app.post decorator
-@app.post("/v1/chat/completions")
-async def _v1_chat_completions_handler(request: Request):
-    try:
-        body_bytes = await request.body()
-        body_json = {}
-        if body_bytes:
-            body_json = json.loads(body_bytes)
-
-        client_requests_stream = body_json.get("stream", False)
-
-        if client_requests_stream:
-            return StreamingResponse(content=_dynamic_route_v1_request_generator(
-                request, body=body_json, body_bytes=body_bytes
-            ))
-        else:
-            response_data = await _fetch_non_streaming_v1_response(
-                request, body=body_json, body_bytes=body_bytes
-            )
-            if isinstance(response_data, dict):
-                if "error" in response_data:
-                    error_type = response_data.get("error", {}).get("type", "unknown_error")
-                    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-                    if error_type == "invalid_request_error":
-                        status_code = status.HTTP_400_BAD_REQUEST
-                    elif error_type == "runner_startup_error" or error_type == "runner_communication_error":
-                        status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-                    return JSONResponse(content=response_data, status_code=status_code)
-                return JSONResponse(content=response_data)
-            else:
-                logging.error("Non-streaming /v1/chat/completions request did not return a dict as expected.")
-                return JSONResponse(content={"error": {"message": "Internal server error: Invalid response type.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    except json.JSONDecodeError:
-        return JSONResponse(content={"error": {"message": "Invalid JSON in request body.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Error in /v1/chat/completions handler: {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": {"message": f"Internal server error: {e}", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-@app.post("/v1/completions")
-async def _v1_completions_handler(request: Request):
-    try:
-        body_bytes = await request.body()
-        body_json = {}
-        if body_bytes:
-            body_json = json.loads(body_bytes)
-
-        client_requests_stream = body_json.get("stream", False)
-
-        if client_requests_stream:
-            return StreamingResponse(content=_dynamic_route_v1_request_generator(
-                request, body=body_json, body_bytes=body_bytes
-            ))
-        else:
-            response_data = await _fetch_non_streaming_v1_response(
-                request, body=body_json, body_bytes=body_bytes
-            )
-            if isinstance(response_data, dict):
-                if "error" in response_data:
-                    error_type = response_data.get("error", {}).get("type", "unknown_error")
-                    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-                    if error_type == "invalid_request_error":
-                        status_code = status.HTTP_400_BAD_REQUEST
-                    elif error_type == "runner_startup_error" or error_type == "runner_communication_error":
-                        status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-                    return JSONResponse(content=response_data, status_code=status_code)
-                return JSONResponse(content=response_data)
-            else:
-                logging.error("Non-streaming /v1/completions request did not return a dict as expected.")
-                return JSONResponse(content={"error": {"message": "Internal server error: Invalid response type.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    except json.JSONDecodeError:
-        return JSONResponse(content={"error": {"message": "Invalid JSON in request body.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Error in /v1/completions handler: {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": {"message": f"Internal server error: {e}", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-@app.post("/v1/embeddings")
-async def _v1_embeddings_handler(request: Request):
-    try:
-        body_bytes = await request.body()
-        body_json = {}
-        if body_bytes:
-            body_json = json.loads(body_bytes)
-
-        # Embeddings are non-streaming.
-        response_data = await _fetch_non_streaming_v1_response(
-            request, 
-            body=body_json, 
-            body_bytes=body_bytes,
-        )
-
-        if isinstance(response_data, dict):
-            if "error" in response_data:
-                error_type = response_data.get("error", {}).get("type", "unknown_error")
-                status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-                if error_type == "invalid_request_error":
-                    status_code = status.HTTP_400_BAD_REQUEST
-                elif error_type == "runner_startup_error" or error_type == "runner_communication_error":
-                    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-                return JSONResponse(content=response_data, status_code=status_code)
-            return JSONResponse(content=response_data)
-        elif isinstance(response_data, list):
-            # If the response is a list, we expect it to be in the LM Studio format
-            embedding_obj = response_data[0]
-            if isinstance(embedding_obj, dict):
-                # Check if it has the expected structure for embeddings
-                if 'embedding' in embedding_obj:
-                    embedding_arr = embedding_obj.get('embedding')
-                    if isinstance(embedding_arr, list) and len(embedding_arr) > 0:
-                        # Create one embedding object per vector in the array
-                        embedding_objects = [
-                            {
-                                "object": "embedding",
-                                "embedding": vector,
-                            }
-                            for vector in embedding_arr
-                        ]
-                        
-                        obj_resp = {
-                            "object": "list",
-                            "data": embedding_objects,
-                            "model": body_json.get("model", "unknown_model"),
-                            "usage": {
-                                "prompt_tokens": 0,
-                                "total_tokens": 0
-                            }
-                        }
-                        return JSONResponse(content=obj_resp)
-                    else:
-                        logging.error("Non-streaming /v1/embeddings request returned an invalid embedding array: " + str(embedding_arr))
-                        return JSONResponse(content={"error": {"message": "Invalid embedding data format.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
-                else:
-                    logging.error("Non-streaming /v1/embeddings request returned an invalid object structure: " + str(embedding_obj))
-                    return JSONResponse(content={"error": {"message": "Invalid response structure for embeddings.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            else:
-                logging.error("Non-streaming /v1/embeddings request returned a list with non-dict items: " + str(response_data))
-                return JSONResponse(content={"error": {"message": "Invalid response type for embeddings.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
-            # This case should ideally not be reached if the generator works as expected.
-            logging.error("Non-streaming /v1/embeddings request did not return a dict: " + str(response_data) + " of type " + str(type(response_data)))
-            return JSONResponse(content={"error": {"message": "Internal server error: Invalid response type from generator for embeddings.", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    except json.JSONDecodeError:
-        return JSONResponse(content={"error": {"message": "Invalid JSON in request body.", "type": "invalid_request_error"}}, status_code=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Error in /v1/embeddings handler: {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": {"message": f"Internal server error: {e}", "type": "internal_error"}}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+app.post("/v1/chat/completions")(_make_proxy_handler())
+app.post("/v1/completions")(_make_proxy_handler())
+app.post("/v1/embeddings")(_make_proxy_handler(allow_stream=False, post_process=_embeddings_list_response))
 
 logging.info("Updated dynamic routing handlers for /v1/chat/completions, /v1/completions, /v1/embeddings to support conditional streaming.")
 
@@ -996,18 +1079,44 @@ class LMStudioProxyServer:
                  get_runner_port_callback: Callable[[str], Optional[int]],
                  request_runner_start_callback: Callable[[str], asyncio.Future],
                  on_runner_port_ready: Callable[[str, int], None],
-                 on_runner_stopped: Callable[[str], None]):
+                 on_runner_stopped: Callable[[str], None],
+                 prompt_logging_enabled: bool = False):
         self.all_models_config = all_models_config
         self.runtimes_config = runtimes_config
+        # The "logging.prompt_logging_enabled" config option: log request and
+        # response bodies of forwarded requests.
+        self.prompt_logging_enabled = prompt_logging_enabled
         self.is_model_running_callback = is_model_running_callback
         self.get_runner_port_callback = get_runner_port_callback
         self.request_runner_start_callback = request_runner_start_callback
         self._uvicorn_server = None
         self.task = None
-        self._runner_ready_futures: Dict[str, asyncio.Future] = {}
+        # In-flight runner startups, one per model, shared by every request that
+        # arrives while the model is loading.
+        self._startup_tasks: Dict[str, asyncio.Task] = {}
         # The callbacks are not used by the server itself but are passed for consistency
         # They will be used by the bridge if needed.
 
+    def _get_startup_task(self, model_name: str) -> asyncio.Task:
+        """Return the startup task for model_name, creating it if none is in flight."""
+        task = self._startup_tasks.get(model_name)
+        if task is None:
+            logging.debug("Creating new startup task for %s", model_name)
+            task = asyncio.create_task(self.request_runner_start_callback(model_name))
+            self._startup_tasks[model_name] = task
+            task.add_done_callback(functools.partial(self._on_startup_task_done, model_name))
+        else:
+            logging.debug("Using existing startup task for %s", model_name)
+        return task
+
+    def _on_startup_task_done(self, model_name: str, task: asyncio.Task):
+        if self._startup_tasks.get(model_name) is task:
+            del self._startup_tasks[model_name]
+        # Every waiter may have given up already; retrieve the outcome so a
+        # failed startup is not reported again as an unretrieved exception.
+        if not task.cancelled():
+            task.exception()
+
     async def start(self):
         app.state.all_models_config = self.all_models_config
         app.state.runtimes_config = self.runtimes_config
@@ -1015,7 +1124,26 @@ class LMStudioProxyServer:
         app.state.get_runner_port_callback = self.get_runner_port_callback
         app.state.request_runner_start_callback = self.request_runner_start_callback
         app.state.proxy_thread_instance = self  # Maintain compatibility with handlers
+        app.state.prompt_logging_enabled = self.prompt_logging_enabled
+        # Shared by all forwarded requests, so connections to the runners are
+        # kept alive instead of being set up and torn down per request.
+        app.state.http_client = httpx.AsyncClient(
+            timeout=600.0,
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+        )
+        # With prompt logging on, records are written by a background task so
+        # decoding and formatting request/response bodies stays off the request
+        # path. Otherwise nothing is ever logged and no task is started.
+        prompt_log_task = None
+        if self.prompt_logging_enabled:
+            app.state.prompt_log_queue = asyncio.Queue(maxsize=_PROMPT_LOG_QUEUE_SIZE)
+            prompt_log_task = asyncio.create_task(_prompt_log_worker(
+                app.state.prompt_log_queue, getattr(app.state, 'prompts_logger', logging.getLogger())
+            ))
 
+        # serve() runs on the application's (qasync) loop, so uvicorn's loop
+        # setting does not apply here. Its default http="auto" does: it picks
+        # the httptools parser when installed and falls back to h11.
         uvicorn_config = uvicorn.Config(app, host="127.0.0.1", port=1234, log_level="info")
         self._uvicorn_server = uvicorn.Server(uvicorn_config)
 
@@ -1025,6 +1153,13 @@ class LMStudioProxyServer:
         except asyncio.CancelledError:
             logging.info("LM Studio Proxy server task cancelled.")
         finally:
+            await app.state.http_client.aclose()
+            if prompt_log_task is not None:
+                prompt_log_task.cancel()
+                queue = app.state.prompt_log_queue
+                app.state.prompt_log_queue = None
+                while not queue.empty():
+                    _emit_prompt_log(getattr(app.state, 'prompts_logger', logging.getLogger()), *queue.get_nowait())
             logging.info("LM Studio Proxy server shut down.")
 
     def stop(self):
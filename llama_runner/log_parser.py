@@ -1,5 +1,6 @@
+import itertools
 import re
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 from dataclasses import dataclass
 from enum import Enum
 
@@ -10,7 +11,7 @@ class ModelStatus(Enum):
     GENERATING_RESPONSE = "Generating response"
     COMPLETED = "Completed"
 
-@dataclass
+@dataclass(slots=True)
 class ModelStatusInfo:
     status: ModelStatus
     progress: Optional[float] = None
@@ -20,21 +21,62 @@ class ModelStatusInfo:
     generated_tokens: Optional[int] = None
     total_tokens: Optional[int] = None
 
+# Compiled once per process and shared by every parser.
+_PATTERNS = {
+    'new_prompt': re.compile(r'new prompt, n_ctx_slot = \d+, n_keep = \d+, n_prompt_tokens = (\d+)'),
+    'prompt_progress': re.compile(r'prompt processing progress, n_past = (\d+), n_tokens = (\d+), progress = ([\d.]+)'),
+    'prompt_done': re.compile(r'prompt done, n_past = (\d+), n_tokens = (\d+)'),
+    'prompt_eval_time': re.compile(r'prompt eval time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*tokens'),
+    'eval_time': re.compile(r'eval time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*tokens'),
+    'all_idle': re.compile(r'all slots are idle'),
+    'processing_task': re.compile(r'processing task'),
+}
+# One alternation of the events' fixed text, so parse_log_line scans each line
+# once instead of once per event. The text found selects the event, whose
+# pattern in _PATTERNS is then matched at that position. At a "prompt eval
+# time" the longer alternative wins over "eval time".
+_EVENT_PATTERN = re.compile(
+    r'new prompt|prompt (?:processing progress|done|eval time)|eval time|all slots are idle|processing task'
+)
+_EVENT_NAMES = {
+    'new prompt': 'new_prompt',
+    'prompt processing progress': 'prompt_progress',
+    'prompt done': 'prompt_done',
+    'prompt eval time': 'prompt_eval_time',
+    'eval time': 'eval_time',
+    'all slots are idle': 'all_idle',
+    'processing task': 'processing_task',
+}
+
+def _rmatches(pattern: re.Pattern, text: str, literal: str) -> Iterator[re.Match]:
+    """Yield the matches of `pattern` in `text` from last to first.
+
+    Every match must start with `literal`, which must not occur again inside a
+    match. Occurrences of `literal` are found with str.rfind and the pattern is
+    only tried there, so taking the first match looks at the end of the text
+    only.
+    """
+    pos = text.rfind(literal)
+    while pos != -1:
+        match = pattern.match(text, pos)
+        if match is not None:
+            yield match
+        pos = text.rfind(literal, 0, pos)
+
 class LlamaLogParser:
     """Parser for llama.cpp server logs to extract model status information."""
 
     def __init__(self):
-        self.patterns = {
-            'new_prompt': re.compile(r'new prompt, n_ctx_slot = \d+, n_keep = \d+, n_prompt_tokens = (\d+)'),
-            'prompt_progress': re.compile(r'prompt processing progress, n_past = (\d+), n_tokens = (\d+), progress = ([\d.]+)'),
-            'prompt_done': re.compile(r'prompt done, n_past = (\d+), n_tokens = (\d+)'),
-            'prompt_eval_time': re.compile(r'prompt eval time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*tokens'),
-            'eval_time': re.compile(r'eval time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*tokens'),
-            'all_idle': re.compile(r'all slots are idle'),
-            'processing_task': re.compile(r'processing task'),
-        }
+        self.patterns = _PATTERNS
+        self.event_pattern = _EVENT_PATTERN
+        self.event_names = _EVENT_NAMES
         # For tracking timing information across multiple lines
         self.pending_timing_info = {}
+        # State kept between feed() calls
+        self._feed_status = ModelStatusInfo(status=ModelStatus.IDLE)
+        self._feed_prompt_eval: Optional[re.Match] = None
+        self._feed_eval: Optional[re.Match] = None
+        self._feed_task_after_timing = False
         # For debugging
         self.debug = False
 
@@ -47,64 +89,65 @@ class LlamaLogParser:
             print(f"DEBUG: Parsing line: {line[:50]}...")
             print(f"DEBUG: Current status: {current_status.status.value}")
 
+        # Most lines are none of the events and leave the status as it is. Four
+        # substring tests rule them out for less than one regex scan costs,
+        # since re has to try the alternation at every position.
+        found = None
+        if 'prompt' in line or 'eval time' in line or 'processing task' in line or 'slots are idle' in line:
+            found = self.event_pattern.search(line)
+        if found is None:
+            if self.debug:
+                print(f"DEBUG: No status change, returning current status")
+            return current_status
+        event = self.event_names[found.group()]
+        match = self.patterns[event].match(line, found.start())
+
         # Check for new prompt - this should reset timing info and start processing
-        if 'new prompt' in line:
-            match = self.patterns['new_prompt'].search(line)
-            if match:
-                prompt_tokens = int(match.group(1))
-                if self.debug:
-                    print(f"DEBUG: Found new prompt with {prompt_tokens} tokens")
-                # Reset timing info when starting a new prompt
-                self.pending_timing_info = {}
-                return ModelStatusInfo(
-                    status=ModelStatus.STARTING,
-                    prompt_tokens=prompt_tokens
-                )
+        if event == 'new_prompt' and match:
+            prompt_tokens = int(match.group(1))
+            if self.debug:
+                print(f"DEBUG: Found new prompt with {prompt_tokens} tokens")
+            # Reset timing info when starting a new prompt
+            self.pending_timing_info = {}
+            return ModelStatusInfo(
+                status=ModelStatus.STARTING,
+                prompt_tokens=prompt_tokens
+            )
 
         # Check for prompt processing progress
-        if 'prompt processing progress' in line:
-            match = self.patterns['prompt_progress'].search(line)
-            if match:
-                n_past = int(match.group(1))
-                n_tokens = int(match.group(2))
-                progress = float(match.group(3))
-                if self.debug:
-                    print(f"DEBUG: Prompt processing progress: {progress*100:.1f}%")
-                return ModelStatusInfo(
-                    status=ModelStatus.PROCESSING_PROMPT,
-                    progress=progress * 100,
-                    prompt_tokens=n_tokens
-                )
+        if event == 'prompt_progress' and match:
+            n_tokens = int(match.group(2))
+            progress = float(match.group(3))
+            if self.debug:
+                print(f"DEBUG: Prompt processing progress: {progress*100:.1f}%")
+            return ModelStatusInfo(
+                status=ModelStatus.PROCESSING_PROMPT,
+                progress=progress * 100,
+                prompt_tokens=n_tokens
+            )
 
         # Check for prompt done
-        if 'prompt done' in line:
-            match = self.patterns['prompt_done'].search(line)
-            if match:
-                n_past = int(match.group(1))
-                n_tokens = int(match.group(2))
-                if self.debug:
-                    print(f"DEBUG: Prompt done")
-                return ModelStatusInfo(
-                    status=ModelStatus.GENERATING_RESPONSE,
-                    prompt_tokens=n_tokens
-                )
+        if event == 'prompt_done' and match:
+            n_tokens = int(match.group(2))
+            if self.debug:
+                print(f"DEBUG: Prompt done")
+            return ModelStatusInfo(
+                status=ModelStatus.GENERATING_RESPONSE,
+                prompt_tokens=n_tokens
+            )
 
         # Check for timing information - collect timing data across multiple lines
-        if 'prompt eval time' in line:
-            match = self.patterns['prompt_eval_time'].search(line)
-            if match:
-                self.pending_timing_info['prompt_eval_time'] = float(match.group(1))
-                self.pending_timing_info['prompt_tokens'] = int(match.group(2))
-                if self.debug:
-                    print(f"DEBUG: Found prompt eval time: {float(match.group(1))}ms for {int(match.group(2))} tokens")
+        if event == 'prompt_eval_time' and match:
+            self.pending_timing_info['prompt_eval_time'] = float(match.group(1))
+            self.pending_timing_info['prompt_tokens'] = int(match.group(2))
+            if self.debug:
+                print(f"DEBUG: Found prompt eval time: {float(match.group(1))}ms for {int(match.group(2))} tokens")
 
-        if 'eval time' in line and 'prompt eval time' not in line:
-            match = self.patterns['eval_time'].search(line)
-            if match:
-                self.pending_timing_info['eval_time'] = float(match.group(1))
-                self.pending_timing_info['generated_tokens'] = int(match.group(2))
-                if self.debug:
-                    print(f"DEBUG: Found eval time: {float(match.group(1))}ms for {int(match.group(2))} tokens")
+        if event == 'eval_time' and match:
+            self.pending_timing_info['eval_time'] = float(match.group(1))
+            self.pending_timing_info['generated_tokens'] = int(match.group(2))
+            if self.debug:
+                print(f"DEBUG: Found eval time: {float(match.group(1))}ms for {int(match.group(2))} tokens")
 
         # If we have all the timing information, compute speeds and mark as completed
         if ('prompt_eval_time' in self.pending_timing_info and
@@ -136,7 +179,7 @@ class LlamaLogParser:
             )
 
         # Check for idle state - this should also reset timing info
-        if 'all slots are idle' in line:
+        if event == 'all_idle':
             if self.debug:
                 print(f"DEBUG: Found idle state")
             # Clear pending timing info when going idle
@@ -144,27 +187,20 @@ class LlamaLogParser:
             return ModelStatusInfo(status=ModelStatus.IDLE)
 
         # Check for processing task (transition from idle to starting) - this should reset timing info
-        if 'processing task' in line and current_status.status == ModelStatus.IDLE:
+        if event == 'processing_task' and current_status.status == ModelStatus.IDLE:
             if self.debug:
                 print(f"DEBUG: Found processing task, transitioning from IDLE to STARTING")
             # Reset timing info when starting a new task
             self.pending_timing_info = {}
             return ModelStatusInfo(status=ModelStatus.STARTING)
 
-        # If we're in COMPLETED state and we get a new task or prompt, transition to STARTING
+        # If we're in COMPLETED state and we get a new task or prompt, transition to STARTING.
+        # A new prompt with a token count has already returned above.
         if current_status.status == ModelStatus.COMPLETED:
-            if 'processing task' in line or 'new prompt' in line:
+            if event == 'processing_task' or event == 'new_prompt':
                 if self.debug:
                     print(f"DEBUG: Found new task/prompt while COMPLETED, transitioning to STARTING")
                 self.pending_timing_info = {}  # Reset timing info
-                if 'new prompt' in line:
-                    match = self.patterns['new_prompt'].search(line)
-                    if match:
-                        prompt_tokens = int(match.group(1))
-                        return ModelStatusInfo(
-                            status=ModelStatus.STARTING,
-                            prompt_tokens=prompt_tokens
-                        )
                 return ModelStatusInfo(status=ModelStatus.STARTING)
 
         if self.debug:
@@ -176,37 +212,35 @@ class LlamaLogParser:
         if self.debug:
             print(f"DEBUG: parse_multiple_lines called with {len(lines)} lines")
 
-        # Look for timing information in the full log by finding prompt eval and eval time lines
+        # Look for timing information in the full log by finding the last prompt
+        # eval and eval time lines. Only the last of each is used, so the log is
+        # searched from the end.
         full_log = "\n".join(lines)
-        prompt_eval_matches = list(self.patterns['prompt_eval_time'].finditer(full_log))
-        eval_matches = list(self.patterns['eval_time'].finditer(full_log))
-
-        # Filter out eval matches that are actually prompt eval matches
-        filtered_eval_matches = []
-        for match in eval_matches:
-            # Check if this match is part of a prompt eval time line
-            start, end = match.span()
-            # Look for the line containing this match
-            line_start = full_log.rfind("\n", 0, start) + 1
-            line_end = full_log.find("\n", start)
-            if line_end == -1:
-                line_end = len(full_log)
-            line = full_log[line_start:line_end]
-            if not line.startswith('prompt eval time'):
-                filtered_eval_matches.append(match)
+        last_prompt_eval = next(_rmatches(self.patterns['prompt_eval_time'], full_log, 'prompt eval time'), None)
+        last_eval = None
+        if last_prompt_eval is not None:
+            for match in _rmatches(self.patterns['eval_time'], full_log, 'eval time'):
+                # Skip eval matches that are actually part of a prompt eval time line
+                line_start = full_log.rfind("\n", 0, match.start()) + 1
+                if not full_log.startswith('prompt eval time', line_start):
+                    last_eval = match
+                    break
 
         # Check if we have timing information
-        if prompt_eval_matches and filtered_eval_matches:
+        if last_prompt_eval is not None and last_eval is not None:
             # Get the position of the last timing information
-            last_prompt_eval = prompt_eval_matches[-1]
-            last_eval = filtered_eval_matches[-1]
             last_timing_pos = max(last_prompt_eval.end(), last_eval.end())
 
-            # Check if there are any task-initiating events AFTER the timing information
+            # Check if there are any task-initiating events AFTER the timing information.
+            # Lines are walked back from the end, tracking where each starts in
+            # full_log, so only the lines after the timing information are looked at.
             has_newer_tasks = False
-            for line in lines:
-                if (('processing task' in line or 'new prompt' in line) and
-                    full_log.find(line) > last_timing_pos):
+            line_start = len(full_log) + 1
+            for line in reversed(lines):
+                line_start -= len(line) + 1
+                if line_start <= last_timing_pos:
+                    break
+                if 'processing task' in line or 'new prompt' in line:
                     has_newer_tasks = True
                     if self.debug:
                         print(f"DEBUG: Found newer task after timing info: {line[:50]}")
@@ -214,37 +248,82 @@ class LlamaLogParser:
 
             # If no newer tasks found after timing info, use timing-based COMPLETED status
             if not has_newer_tasks:
-                prompt_eval_time = float(last_prompt_eval.group(1))
-                prompt_tokens = int(last_prompt_eval.group(2))
-                eval_time = float(last_eval.group(1))
-                generated_tokens = int(last_eval.group(2))
-
-                processing_speed = (prompt_tokens / prompt_eval_time) * 1000 if prompt_eval_time > 0 else 0
-                generation_speed = (generated_tokens / eval_time) * 1000 if eval_time > 0 else 0
-
-                result = ModelStatusInfo(
-                    status=ModelStatus.COMPLETED,
-                    processing_speed=processing_speed,
-                    generation_speed=generation_speed,
-                    prompt_tokens=prompt_tokens,
-                    generated_tokens=generated_tokens,
-                    total_tokens=prompt_tokens + generated_tokens
-                )
-
+                result = self._timing_status(last_prompt_eval, last_eval)
                 if self.debug:
-                    print(f"DEBUG: parse_multiple_lines returning COMPLETED with speeds: {processing_speed:.1f}, {generation_speed:.1f}")
+                    print(f"DEBUG: parse_multiple_lines returning COMPLETED with speeds: {result.processing_speed:.1f}, {result.generation_speed:.1f}")
                 return result
 
-        # If no timing info or newer tasks exist, process line by line
+        # If no timing info or newer tasks exist, process line by line.
+        # "all slots are idle" puts the parser back in the state it starts in
+        # here, so only the lines after the last one can change the result.
+        start = 0
+        for i in range(len(lines) - 1, -1, -1):
+            if 'slots are idle' in lines[i]:
+                found = self.event_pattern.search(lines[i])
+                if found is not None and found.group() == 'all slots are idle':
+                    start = i + 1
+                    break
+
         status = ModelStatusInfo(status=ModelStatus.IDLE)
         self.pending_timing_info = {}  # Reset timing info
-        for line in lines:
+        for line in itertools.islice(lines, start, None):
             status = self.parse_log_line(line, status)
 
         if self.debug:
             print(f"DEBUG: parse_multiple_lines returning line-by-line status: {status.status.value}")
         return status
 
+    def _timing_status(self, prompt_eval_match: re.Match, eval_match: re.Match) -> ModelStatusInfo:
+        """Build the COMPLETED status from a prompt eval time and an eval time match."""
+        prompt_eval_time = float(prompt_eval_match.group(1))
+        prompt_tokens = int(prompt_eval_match.group(2))
+        eval_time = float(eval_match.group(1))
+        generated_tokens = int(eval_match.group(2))
+
+        processing_speed = (prompt_tokens / prompt_eval_time) * 1000 if prompt_eval_time > 0 else 0
+        generation_speed = (generated_tokens / eval_time) * 1000 if eval_time > 0 else 0
+
+        return ModelStatusInfo(
+            status=ModelStatus.COMPLETED,
+            processing_speed=processing_speed,
+            generation_speed=generation_speed,
+            prompt_tokens=prompt_tokens,
+            generated_tokens=generated_tokens,
+            total_tokens=prompt_tokens + generated_tokens
+        )
+
+    def feed(self, lines: Iterable[str]) -> ModelStatusInfo:
+        """Parse log lines that follow the ones fed before and return the current status.
+
+        The result is what parse_multiple_lines would return for every line fed
+        so far, but only the new lines are looked at, so a caller polling a
+        growing log does not parse it all again each time.
+        """
+        status = self._feed_status
+        for line in lines:
+            status = self.parse_log_line(line, status)
+            # Track the latest timing lines and whether a task started after
+            # them, as parse_multiple_lines does with positions in the full log.
+            timing_found = False
+            if 'eval time' in line:
+                for match in self.patterns['prompt_eval_time'].finditer(line):
+                    self._feed_prompt_eval = match
+                    timing_found = True
+                if not line.startswith('prompt eval time'):
+                    for match in self.patterns['eval_time'].finditer(line):
+                        self._feed_eval = match
+                        timing_found = True
+            if timing_found:
+                self._feed_task_after_timing = False
+            elif 'processing task' in line or 'new prompt' in line:
+                self._feed_task_after_timing = True
+        self._feed_status = status
+
+        if (self._feed_prompt_eval is not None and self._feed_eval is not None
+                and not self._feed_task_after_timing):
+            return self._timing_status(self._feed_prompt_eval, self._feed_eval)
+        return status
+
     def format_status_text(self, status_info: ModelStatusInfo) -> str:
         """Format status information for display."""
         if status_info.status == ModelStatus.IDLE:
@@ -1,5 +1,5 @@
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QTextEdit, QDialogButtonBox, QSizePolicy, QPushButton
+    QDialog, QVBoxLayout, QPlainTextEdit, QDialogButtonBox, QSizePolicy, QPushButton
 )
 from PySide6.QtCore import QTimer
 
@@ -7,7 +7,15 @@ from PySide6.QtCore import QTimer
 class LogViewerDialog(QDialog):
     """
     Custom dialog to display live logs from a running process.
+
+    log_provider_callback(cursor) returns (new_lines, cursor, restarted): the
+    lines produced since `cursor` (None on the first call), the cursor for the
+    next call, and whether the process was restarted since, in which case the
+    lines already shown belong to the old process.
     """
+    # Oldest lines are dropped from the view beyond this many.
+    MAX_LINES = 10000
+
     def __init__(self, title, log_provider_callback, parent=None):
         super().__init__(parent)
         self.setWindowTitle(title)
@@ -16,12 +24,16 @@ class LogViewerDialog(QDialog):
         
         # Callback to get logs
         self.log_provider_callback = log_provider_callback
+        self._log_cursor = None
+        # True while the view holds a placeholder message instead of log lines.
+        self._showing_message = False
         
         layout = QVBoxLayout()
         
         # Create text edit for logs
-        self.log_text_edit = QTextEdit()
+        self.log_text_edit = QPlainTextEdit()
         self.log_text_edit.setReadOnly(True)
+        self.log_text_edit.setMaximumBlockCount(self.MAX_LINES)
         self.log_text_edit.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         layout.addWidget(self.log_text_edit)
         
@@ -53,18 +65,31 @@ class LogViewerDialog(QDialog):
         self.refresh_logs()
     
     def refresh_logs(self):
-        """Refresh the log display with current logs."""
+        """Append the log lines produced since the last refresh."""
         try:
-            log_lines = self.log_provider_callback()
-            if log_lines:
-                self.log_text_edit.setPlainText("\n".join(log_lines))
-                # Scroll to bottom to show latest logs
-                scrollbar = self.log_text_edit.verticalScrollBar()
-                scrollbar.setValue(scrollbar.maximum())
-            else:
-                self.log_text_edit.setPlainText("No logs available.")
+            new_lines, self._log_cursor, restarted = self.log_provider_callback(self._log_cursor)
         except Exception as e:
-            self.log_text_edit.setPlainText(f"Error retrieving logs: {str(e)}")
+            self._show_message(f"Error retrieving logs: {str(e)}")
+            self._log_cursor = None
+            return
+
+        if restarted or self._showing_message:
+            self.log_text_edit.clear()
+            self._showing_message = False
+        if new_lines:
+            # Only follow the output if the user has not scrolled up to read
+            # something.
+            scrollbar = self.log_text_edit.verticalScrollBar()
+            at_bottom = scrollbar.value() == scrollbar.maximum()
+            self.log_text_edit.appendPlainText("\n".join(new_lines))
+            if at_bottom:
+                scrollbar.setValue(scrollbar.maximum())
+        elif self.log_text_edit.document().isEmpty():
+            self._show_message("No logs available.")
+
+    def _show_message(self, message):
+        self.log_text_edit.setPlainText(message)
+        self._showing_message = True
     
     def toggle_auto_refresh(self):
         """Toggle auto-refresh functionality."""
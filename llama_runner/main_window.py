@@ -2,6 +2,7 @@ import os
 import sys
 import subprocess
 import asyncio
+import functools
 from typing import Optional, Dict, List
 
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QListWidget, QStackedWidget)
@@ -33,6 +34,7 @@ class MainWindow(QWidget):
         proxies_config = self.config.get('proxies', {})
         self.ollama_proxy_enabled = proxies_config.get('ollama', {}).get('enabled', True)
         self.lmstudio_proxy_enabled = proxies_config.get('lmstudio', {}).get('enabled', True)
+        self.prompt_logging_enabled = self.config.get('logging', {}).get('prompt_logging_enabled', False)
 
         self.model_status_widgets: Dict[str, ModelStatusWidget] = {}
         self.lmstudio_proxy_server: Optional[LMStudioProxyServer] = None
@@ -60,6 +62,7 @@ class MainWindow(QWidget):
                 request_runner_start_callback=self.llama_runner_manager.request_runner_start, # type: ignore
                 on_runner_port_ready=self.on_runner_port_ready,
                 on_runner_stopped=self.on_runner_stopped,
+                prompt_logging_enabled=self.prompt_logging_enabled,
             )
 
         if self.ollama_proxy_enabled:
@@ -94,8 +97,7 @@ class MainWindow(QWidget):
             status_widget.stop_button.clicked.connect(lambda checked, name=model_name: asyncio.create_task(self.llama_runner_manager.stop_llama_runner(name)))
             
             # Set up log monitoring for this model
-            log_provider = lambda name=model_name: self.llama_runner_manager.get_runner_logs(name)
-            status_widget.set_log_provider(log_provider)
+            status_widget.set_log_provider(functools.partial(self.get_runner_logs_since, model_name))
 
         self.model_list_widget.currentItemChanged.connect(self.on_model_selection_changed)
         self.edit_config_button = QPushButton("Edit config")
@@ -202,16 +204,14 @@ class MainWindow(QWidget):
         else:
             subprocess.run(["xdg-open", config_path])
     
-    def get_current_runner_logs(self):
-        """Get logs from the currently selected runner."""
-        if not self.currently_selected_model:
-            return []
-        
-        # Get the runner from the manager
-        runner = self.llama_runner_manager.runners.get(self.currently_selected_model)
-        if runner:
-            return runner.get_output_buffer()
-        return []
+    def get_runner_logs_since(self, model_name, cursor):
+        """Get the log lines a model's runner has produced since `cursor`.
+
+        Returns (lines, cursor, restarted) as LogViewerDialog expects; see
+        LlamaRunnerManager.get_runner_logs_since. Looked up on the current
+        manager, which a config reload replaces.
+        """
+        return self.llama_runner_manager.get_runner_logs_since(model_name, cursor)
     
     def update_log_viewer_button_state(self):
         """Enable or disable the log viewer button based on runner state."""
@@ -246,6 +246,7 @@ class MainWindow(QWidget):
         proxies_config = self.config.get('proxies', {})
         self.ollama_proxy_enabled = proxies_config.get('ollama', {}).get('enabled', True)
         self.lmstudio_proxy_enabled = proxies_config.get('lmstudio', {}).get('enabled', True)
+        self.prompt_logging_enabled = self.config.get('logging', {}).get('prompt_logging_enabled', False)
 
         # Reinitialize the LlamaRunnerManager with the new configuration
         self.llama_runner_manager = LlamaRunnerManager(
@@ -279,6 +280,7 @@ class MainWindow(QWidget):
                 request_runner_start_callback=self._create_future_wrapper(self.llama_runner_manager.request_runner_start),
                 on_runner_port_ready=self.on_runner_port_ready,
                 on_runner_stopped=self.on_runner_stopped,
+                prompt_logging_enabled=self.prompt_logging_enabled,
             )
         elif not self.lmstudio_proxy_enabled and self.lmstudio_proxy_server:
             self.lmstudio_proxy_server.stop()
@@ -291,7 +293,7 @@ class MainWindow(QWidget):
 
         dialog = LogViewerDialog(
             title=f"Logs for {self.currently_selected_model}",
-            log_provider_callback=self.get_current_runner_logs,
+            log_provider_callback=functools.partial(self.get_runner_logs_since, self.currently_selected_model),
             parent=self
         )
         dialog.exec()
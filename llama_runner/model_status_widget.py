@@ -1,5 +1,5 @@
 import logging
-from typing import Optional, Dict, Any, Callable, List
+from typing import Optional, Dict, Any, Callable, List, Tuple
 
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton
 from PySide6.QtCore import Qt, QTimer
@@ -32,7 +32,8 @@ class ModelStatusWidget(QWidget):
         # Log monitoring
         from llama_runner.log_parser import LlamaLogParser
         self.log_parser = LlamaLogParser()
-        self.log_provider_callback: Optional[Callable[[], List[str]]] = None
+        self.log_provider_callback: Optional[Callable[[Any], Tuple[List[str], Any, bool]]] = None
+        self._log_cursor = None
         self.log_monitor_timer = QTimer()
         self.log_monitor_timer.timeout.connect(self._update_status_from_logs)
         self.log_monitor_timer.setInterval(1000)  # Update every second
@@ -181,9 +182,14 @@ class ModelStatusWidget(QWidget):
         self.start_button.setEnabled(start_enabled)
         self.stop_button.setEnabled(stop_enabled)
 
-    def set_log_provider(self, log_provider_callback: Callable[[], List[str]]):
-        """Set the callback function to get logs from the runner."""
+    def set_log_provider(self, log_provider_callback: Callable[[Any], Tuple[List[str], Any, bool]]):
+        """Set the callback function to get logs from the runner.
+
+        log_provider_callback(cursor) returns (new_lines, cursor, restarted)
+        like LogViewerDialog's, so each update parses only the new lines.
+        """
         self.log_provider_callback = log_provider_callback
+        self._log_cursor = None
 
     def start_log_monitoring(self):
         """Start monitoring logs for status updates."""
@@ -199,13 +205,16 @@ class ModelStatusWidget(QWidget):
         if not self.log_provider_callback:
             return
 
-        logs = self.log_provider_callback()
+        logs, self._log_cursor, restarted = self.log_provider_callback(self._log_cursor)
+        from llama_runner.log_parser import LlamaLogParser, ModelStatus
+        if restarted:
+            # The lines fed so far belong to the previous runner.
+            self.log_parser = LlamaLogParser()
         if not logs:
             return  # Keep current status when no new logs
 
-        from llama_runner.log_parser import LlamaLogParser, ModelStatus
-        parser = LlamaLogParser()
-        status_info = parser.parse_multiple_lines(logs)
+        parser = self.log_parser
+        status_info = parser.feed(logs)
 
         # Format status text for display
         status_text = parser.format_status_text(status_info)
@@ -1,5 +1,7 @@
 import sys
 import logging
+import logging.handlers
+import queue
 import argparse
 import os
 import signal
@@ -84,6 +86,18 @@ def main():
         logging.info(f"App file logging to: {app_log_file_path}")
     except Exception as e:
         logging.error(f"Failed to create app file handler for {app_log_file_path}: {e}")
+
+    # Hand records to the real handlers on a background thread, so logging
+    # from the event loop (e.g. llama.cpp output) never blocks on console or
+    # file writes.
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(
+        log_queue, *root_logger.handlers, respect_handler_level=True
+    )
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    log_listener.start()
     # --- End Logging Setup ---
 
     headless_mode = args.headless
@@ -170,6 +184,7 @@ def main():
             config_observer.stop()
             config_observer.join()
         logging.info(f"Application exited with code {exit_code}.")
+        log_listener.stop()
         sys.exit(exit_code)
 
 if __name__ == "__main__":
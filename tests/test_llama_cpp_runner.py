@@ -0,0 +1,110 @@
+import asyncio
+import subprocess
+import sys
+import types
+from pathlib import Path
+import pytest
+
+# Add the root directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llama_runner import llama_cpp_runner
+from llama_runner.llama_cpp_runner import LlamaCppRunner, _kill_orphaned_process
+
+
+def _runner(read_size=4, line_max=16):
+    runner = LlamaCppRunner(model_name="model-1", model_path="/fake/path/model1.gguf")
+    runner.STDOUT_READ_SIZE = read_size
+    runner.OUTPUT_LINE_MAX_BYTES = line_max
+    return runner
+
+
+def _stream(data: bytes) -> asyncio.StreamReader:
+    stream = asyncio.StreamReader()
+    stream.feed_data(data)
+    stream.feed_eof()
+    return stream
+
+
+@pytest.mark.asyncio
+async def test_output_lines_split_across_reads():
+    """Lines cut across reads are reassembled, and the unterminated tail is kept at EOF."""
+    runner = _runner()
+    await runner._read_output_continuously(_stream(b"first line\nsecond\n\nlast"))
+    assert runner.get_output_buffer() == ["first line", "second", "", "last"]
+
+
+@pytest.mark.asyncio
+async def test_overlong_output_line_is_flushed_in_pieces():
+    """A line without a newline is not buffered past OUTPUT_LINE_MAX_BYTES."""
+    runner = _runner()
+    await runner._read_output_continuously(_stream(b"x" * 40 + b"\nok\n"))
+    assert runner.get_output_buffer() == ["x" * 16, "x" * 16, "x" * 8, "ok"]
+
+
+@pytest.mark.asyncio
+async def test_output_reader_cancellation_propagates():
+    """Cancelling the reader while it waits for output cancels its task."""
+    runner = _runner()
+    reader = asyncio.create_task(runner._read_output_continuously(asyncio.StreamReader()))
+    await asyncio.sleep(0)
+    reader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await reader
+    assert reader.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_failing_port_ready_callback_does_not_stop_reader():
+    """An exception from on_port_ready is logged and the rest of the output is still read."""
+    runner = _runner(read_size=64)
+
+    def on_port_ready(model_name, port):
+        raise RuntimeError("callback failed")
+
+    runner.on_port_ready = on_port_ready
+    await runner._read_output_continuously(_stream(b"main: server is listening on http://127.0.0.1:8123\nafter\n"))
+    assert runner.get_port() == 8123
+    assert runner.get_output_buffer()[-1] == "after"
+
+
+@pytest.mark.asyncio
+async def test_finalizer_detached_once_process_exits():
+    """A runner whose process has exited leaves no finalizer behind, and a restart registers only one."""
+    runner = LlamaCppRunner(model_name="model-1", model_path="/fake/path/model1.gguf", llama_cpp_runtime="true")
+    await runner.run()
+    assert runner._finalizer is None
+
+    await runner.start()
+    first = runner._finalizer
+    await runner.process.wait()
+    runner.process = None
+    await runner.start()
+    assert not first.alive
+    assert runner._finalizer.alive
+    await runner.stop()
+    await runner.process.wait()
+    await runner.stop()
+    assert runner._finalizer is None
+
+
+def test_orphan_kill_skips_reaped_process(monkeypatch):
+    """A pid whose process has already been reaped is not signalled, even if returncode was never set."""
+    child = subprocess.Popen(["true"])
+    child.wait()
+    killed = []
+    monkeypatch.setattr(llama_cpp_runner.os, "kill", lambda pid, sig: killed.append(pid))
+    _kill_orphaned_process(types.SimpleNamespace(pid=child.pid, returncode=None))
+    assert killed == []
+
+
+def test_orphan_kill_signals_live_process():
+    """A child that is still running is killed."""
+    child = subprocess.Popen(["sleep", "30"])
+    try:
+        _kill_orphaned_process(types.SimpleNamespace(pid=child.pid, returncode=None))
+        assert child.wait(timeout=5) != 0
+    finally:
+        if child.poll() is None:
+            child.kill()
+            child.wait()
@@ -7,6 +7,7 @@ from unittest.mock import MagicMock, patch
 # Add the root directory to the Python path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from llama_runner.llama_cpp_runner import LlamaCppRunner
 from llama_runner.llama_runner_manager import LlamaRunnerManager
 
 # Mock models and runtimes config
@@ -122,3 +123,210 @@ async def test_runner_stop_and_wait_logic(MockLlamaCppRunner, mock_exists, manag
     await asyncio.wait_for(manager.stop_all_llama_runners_async(), timeout=1.0)
     assert not manager.runners
     assert not manager.runner_tasks
+    assert manager._running_count == 0
+
+
+@pytest.mark.asyncio
+@patch("os.path.exists", return_value=True)
+@patch("llama_runner.llama_runner_manager.LlamaCppRunner")
+async def test_runner_exiting_on_its_own_is_released(MockLlamaCppRunner, mock_exists, manager):
+    """
+    Tests that a runner whose process exits without a stop request no longer
+    counts as running once its task finishes, and is released when stopped.
+    """
+    exit_event = asyncio.Event()
+    mock_runner = MagicMock()
+
+    async def fake_run():
+        await exit_event.wait()
+        mock_runner.on_stopped("model-1")
+
+    mock_runner.run.side_effect = fake_run
+
+    def ctor_side_effect(*args, **kwargs):
+        for k, v in kwargs.items():
+            setattr(mock_runner, k, v)
+        return mock_runner
+
+    MockLlamaCppRunner.side_effect = ctor_side_effect
+
+    start_task = asyncio.create_task(manager.request_runner_start("model-1"))
+    await asyncio.sleep(0)
+    mock_runner.on_port_ready("model-1", 8888)
+    assert await asyncio.wait_for(start_task, timeout=1.0) == 8888
+
+    exit_event.set()
+    await asyncio.sleep(0.01)
+
+    assert "model-1" not in manager.runner_tasks
+    assert not manager.is_llama_runner_running("model-1")
+    assert manager._running_count == 0
+
+    # The runner is kept so its output can still be read until it is stopped.
+    mock_runner.get_output_buffer.return_value = ["crashed"]
+    assert manager.get_runner_logs("model-1") == ["crashed"]
+    await asyncio.wait_for(manager.stop_llama_runner("model-1"), timeout=1.0)
+    assert "model-1" not in manager.runners
+
+
+@pytest.mark.asyncio
+@patch("os.path.exists", return_value=True)
+@patch("llama_runner.llama_runner_manager.LlamaCppRunner")
+async def test_cancelled_start_request_does_not_cancel_shared_startup(MockLlamaCppRunner, mock_exists, manager):
+    """
+    Tests that cancelling one caller waiting for a runner to start leaves the
+    startup in flight for the other callers waiting on the same model.
+    """
+    stop_event = asyncio.Event()
+    mock_runner = MagicMock()
+
+    async def fake_run():
+        await stop_event.wait()
+
+    async def fake_stop():
+        stop_event.set()
+
+    mock_runner.run.side_effect = fake_run
+    mock_runner.stop.side_effect = fake_stop
+
+    def ctor_side_effect(*args, **kwargs):
+        for k, v in kwargs.items():
+            setattr(mock_runner, k, v)
+        return mock_runner
+
+    MockLlamaCppRunner.side_effect = ctor_side_effect
+
+    first = asyncio.create_task(manager.request_runner_start("model-1"))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(manager.request_runner_start("model-1"))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    mock_runner.on_port_ready("model-1", 8888)
+    assert await asyncio.wait_for(second, timeout=1.0) == 8888
+    assert MockLlamaCppRunner.call_count == 1
+
+    await asyncio.wait_for(manager.stop_all_llama_runners_async(), timeout=1.0)
+
+
+@pytest.mark.asyncio
+@patch("os.path.exists", return_value=True)
+@patch("llama_runner.llama_runner_manager.LlamaCppRunner")
+async def test_concurrent_start_requests_spawn_one_runner(MockLlamaCppRunner, mock_exists, manager):
+    """
+    Tests that start requests for the same model issued together share a
+    single runner instead of each spawning their own.
+    """
+    stop_event = asyncio.Event()
+    mock_runner = MagicMock()
+
+    async def fake_run():
+        await stop_event.wait()
+
+    async def fake_stop():
+        stop_event.set()
+
+    mock_runner.run.side_effect = fake_run
+    mock_runner.stop.side_effect = fake_stop
+
+    def ctor_side_effect(*args, **kwargs):
+        for k, v in kwargs.items():
+            setattr(mock_runner, k, v)
+        return mock_runner
+
+    MockLlamaCppRunner.side_effect = ctor_side_effect
+
+    requests = [asyncio.create_task(manager.request_runner_start("model-1")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+
+    mock_runner.on_port_ready("model-1", 8888)
+    assert await asyncio.wait_for(asyncio.gather(*requests), timeout=1.0) == [8888, 8888, 8888]
+    assert MockLlamaCppRunner.call_count == 1
+
+    await asyncio.wait_for(manager.stop_all_llama_runners_async(), timeout=1.0)
+
+
+@pytest.mark.asyncio
+@patch("os.path.exists", return_value=True)
+@patch("llama_runner.llama_runner_manager.LlamaCppRunner")
+async def test_start_request_preempts_runner_still_starting(MockLlamaCppRunner, mock_exists, manager):
+    """
+    Tests that with a limit of one runner, requesting another model while the
+    first one is still loading stops it instead of waiting for it to finish.
+    """
+    def make_runner(model_name):
+        stop_event = asyncio.Event()
+        mock_runner = MagicMock()
+
+        async def fake_run():
+            await stop_event.wait()
+            mock_runner.on_stopped(model_name)
+
+        async def fake_stop():
+            stop_event.set()
+
+        mock_runner.run.side_effect = fake_run
+        mock_runner.stop.side_effect = fake_stop
+        return mock_runner
+
+    runners = [make_runner("model-1"), make_runner("model-2")]
+
+    def ctor_side_effect(*args, **kwargs):
+        mock_obj = runners[MockLlamaCppRunner.call_count - 1]
+        for k, v in kwargs.items():
+            setattr(mock_obj, k, v)
+        return mock_obj
+
+    MockLlamaCppRunner.side_effect = ctor_side_effect
+
+    # model-1 never reports a port.
+    start_task_1 = asyncio.create_task(manager.request_runner_start("model-1"))
+    await asyncio.sleep(0.01)
+    start_task_2 = asyncio.create_task(manager.request_runner_start("model-2"))
+    await asyncio.sleep(0.01)
+
+    runners[0].stop.assert_called_once()
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(start_task_1, timeout=1.0)
+
+    runners[1].on_port_ready("model-2", 9999)
+    assert await asyncio.wait_for(start_task_2, timeout=1.0) == 9999
+    assert "model-1" not in manager.runner_tasks
+
+    await asyncio.wait_for(manager.stop_all_llama_runners_async(), timeout=1.0)
+
+
+@patch("llama_runner.llama_runner_manager.LlamaCppRunner")
+def test_model_file_checked_on_every_start(MockLlamaCppRunner, manager):
+    """A model file removed after the first start is caught on the next one."""
+    with patch("os.path.exists", return_value=True):
+        factory = manager._get_runner_factory("model-1")
+        assert manager._get_runner_factory("model-1") is factory
+    with patch("os.path.exists", return_value=False):
+        with pytest.raises(RuntimeError):
+            manager._get_runner_factory("model-1")
+
+
+def test_runner_logs_since_detects_replaced_runner(manager):
+    """The log cursor follows one runner; a replacement runner's lines are all returned, flagged as restarted."""
+    first = LlamaCppRunner(model_name="model-1", model_path="/fake/path/model1.gguf")
+    first._handle_output_lines([b"a", b"b"])
+    manager.runners["model-1"] = first
+
+    lines, cursor, restarted = manager.get_runner_logs_since("model-1", None)
+    assert (lines, restarted) == (["a", "b"], True)
+    first._handle_output_lines([b"c"])
+    lines, cursor, restarted = manager.get_runner_logs_since("model-1", cursor)
+    assert (lines, restarted) == (["c"], False)
+
+    second = LlamaCppRunner(model_name="model-1", model_path="/fake/path/model1.gguf")
+    second._handle_output_lines([b"x"])
+    manager.runners["model-1"] = second
+    lines, cursor, restarted = manager.get_runner_logs_since("model-1", cursor)
+    assert (lines, restarted) == (["x"], True)
+
+    del manager.runners["model-1"]
+    assert manager.get_runner_logs_since("model-1", cursor) == ([], cursor, False)
@@ -0,0 +1,500 @@
+import json
+import logging
+import sys
+from pathlib import Path
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the root directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llama_runner import lmstudio_proxy_thread
+from llama_runner.headless_service_manager import HeadlessServiceManager
+from llama_runner.lmstudio_proxy_thread import (
+    app, LMStudioProxyServer, _iter_sse_events, _SSEEventSplitter, _sse_event_data, _sse_event_has_fingerprint,
+    _sse_fingerprinter, _json_dumps, _json_loads
+)
+
+MODEL_PATH = str(Path(__file__).parent / "model1.gguf")
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(chunks):
+    return [event async for event in _iter_sse_events(chunks)]
+
+
+@pytest.mark.asyncio
+async def test_sse_events_split_across_chunks():
+    """An event cut in two by the network is reassembled before it is parsed."""
+    events = await _collect(_chunks(b'data: {"a"', b': 1}\n', b'\ndata: [DONE]\n\n'))
+    assert events == [b'data: {"a": 1}', b'data: [DONE]']
+
+
+@pytest.mark.asyncio
+async def test_sse_events_several_in_one_chunk():
+    """A chunk carrying several events yields each of them."""
+    events = await _collect(_chunks(b'data: 1\n\ndata: 2\n\ndata: [DONE]\n\n'))
+    assert events == [b'data: 1', b'data: 2', b'data: [DONE]']
+
+
+@pytest.mark.asyncio
+async def test_sse_events_unterminated_tail():
+    """Whatever is left when the stream ends is still yielded."""
+    events = await _collect(_chunks(b'data: 1\n\n', b'data: 2\n'))
+    assert events == [b'data: 1', b'data: 2\n']
+
+
+@pytest.mark.asyncio
+async def test_sse_events_crlf_line_endings():
+    """CRLF-delimited events are split like LF ones, even with CR and LF in different chunks."""
+    events = await _collect(_chunks(b'data: 1\r\n\r', b'\ndata: 2\r\n\r\n'))
+    assert events == [b'data: 1', b'data: 2']
+
+
+def test_sse_splitter_pending_keeps_partial_event():
+    """The bytes of an unfinished event are handed back as received, ready to be relayed."""
+    splitter = _SSEEventSplitter()
+    assert splitter.feed(b'data: 1\n\ndata: 2') == [b'data: 1']
+    assert splitter.pending() == b'data: 2'
+
+
+def test_sse_event_data_fields():
+    """Data lines are joined and comments and other fields are skipped."""
+    assert _sse_event_data(b'data: {"a": 1}') == b'{"a": 1}'
+    assert _sse_event_data(b': keep-alive\nevent: message\ndata:{"a"\ndata: : 1}') == b'{"a"\n: 1}'
+    assert _sse_event_data(b': keep-alive') is None
+
+
+def test_sse_event_has_fingerprint_top_level_only():
+    """Only a fingerprint at the top level of the payload counts, not a nested key."""
+    assert _sse_event_has_fingerprint(b'data: {"id": "x", "system_fingerprint": "b1"}')
+    assert not _sse_event_has_fingerprint(b'data: {"choices": [{"delta": {"system_fingerprint": "b1"}}]}')
+    assert not _sse_event_has_fingerprint(b'data: {"choices": [{"delta": {"content": "x"}}]}')
+    assert not _sse_event_has_fingerprint(b'data: ["system_fingerprint"]')
+    assert not _sse_event_has_fingerprint(b'data: {"system_fingerprint"')
+
+
+
+def _round_trip_frame(payload: bytes, fingerprint: str) -> bytes:
+    """The frame the proxy wrote before payloads were spliced as bytes."""
+    data = _json_loads(payload)
+    data["system_fingerprint"] = fingerprint
+    return b"data: " + _json_dumps(data) + b"\n\n"
+
+
+def test_sse_fingerprinter_splice_matches_round_trip():
+    """A spliced payload has the bytes of a parse/serialize round-trip of it."""
+    fingerprinted = _sse_fingerprinter("fp-1")
+    for data in ({"id": "x", "choices": [{"delta": {"content": "a}"}}]}, {"a": None}, {"s": "caf\u00e9 \\ \""}):
+        payload = _json_dumps(data)
+        assert fingerprinted(b"data: " + payload) == _round_trip_frame(payload, "fp-1")
+
+
+def test_sse_fingerprinter_objects():
+    """Empty objects and surrounding whitespace still get the fingerprint."""
+    fingerprinted = _sse_fingerprinter("fp-1")
+    assert fingerprinted(b"data: {}") == _round_trip_frame(b"{}", "fp-1")
+    assert fingerprinted(b"data: { }") == _round_trip_frame(b"{}", "fp-1")
+    frame = fingerprinted(b'data:  {"a": 1} \t')
+    assert frame.endswith(b"}\n\n")
+    assert json.loads(frame[len(b"data: "):]) == {"a": 1, "system_fingerprint": "fp-1"}
+
+
+def test_sse_fingerprinter_relays_other_events_unchanged():
+    """[DONE], non-data events, non-object and invalid payloads are only framed."""
+    fingerprinted = _sse_fingerprinter("fp-1")
+    for event in (b"data: [DONE]", b": keep-alive", b"event: ping", b"data: [1, 2]", b'data: "text"', b"data: 5", b"data: {bad"):
+        assert fingerprinted(event) == event + b"\n\n"
+
+
+class _Backend:
+    """Stands in for a runner: records the requests and answers with handler."""
+
+    def __init__(self):
+        self.requests = []
+        self.handler = None
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return self.handler(request)
+
+
+@pytest.fixture
+def app_state():
+    """The proxy app's state, restored after the test."""
+    saved_state = dict(app.state._state)
+    yield app.state
+    app.state._state.clear()
+    app.state._state.update(saved_state)
+
+
+@pytest.fixture
+def backend(app_state):
+    """Configures the proxy app with one running model whose runner is a _Backend."""
+    backend = _Backend()
+    app.state.all_models_config = {"model-1": {"model_path": MODEL_PATH, "llama_cpp_runtime": "default"}}
+    app.state.runtimes_config = {"default": {"runtime": "llama-server"}}
+    app.state.is_model_running_callback = lambda name: True
+    app.state.get_runner_port_callback = lambda name: 8080
+    app.state.proxy_thread_instance = object()
+    app.state.http_client = httpx.AsyncClient(transport=httpx.MockTransport(backend))
+    return backend
+
+
+def _sse_response(*chunks):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream())
+
+
+def _sse_payloads(body: bytes):
+    return [json.loads(event[len(b"data: "):]) for event in body.split(b"\n\n") if event and event != b"data: [DONE]"]
+
+
+def test_stream_relayed_raw_once_runner_fingerprints(backend):
+    """After the first event the runner fingerprinted, the rest of the stream is relayed as received."""
+    backend.handler = lambda request: _sse_response(
+        b'data: {"id": "x", "choices": []}\n\n',
+        b'data: {"id": "x", "system_fingerprint": "b1"}\n\ndata:  {"id"',
+        b': "x",   "choices": []}\r\n\r\n',
+        b'data: [DONE]\n\n',
+    )
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1", "stream": True})
+
+    assert response.status_code == 200
+    first, rest = response.content.split(b"\n\n", 1)
+    assert json.loads(first[len(b"data: "):])["system_fingerprint"] not in (None, "b1")
+    assert rest == b'data: {"id": "x", "system_fingerprint": "b1"}\n\ndata:  {"id": "x",   "choices": []}\r\n\r\ndata: [DONE]\n\n'
+
+
+def test_stream_nested_fingerprint_key_does_not_switch_to_raw(backend):
+    """A nested system_fingerprint key does not stop the proxy from fingerprinting later events."""
+    backend.handler = lambda request: _sse_response(
+        b'data: {"id": "x", "choices": [{"delta": {"system_fingerprint": "b1"}}]}\n\n',
+        b'data: {"id": "x", "choices": []}\n\n',
+        b'data: [DONE]\n\n',
+    )
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1", "stream": True})
+
+    payloads = _sse_payloads(response.content)
+    assert len(payloads) == 2
+    assert payloads[0]["choices"][0]["delta"] == {"system_fingerprint": "b1"}
+    assert all(payload["system_fingerprint"] not in (None, "b1") for payload in payloads)
+    assert response.content.endswith(b"data: [DONE]\n\n")
+
+
+def test_stream_unterminated_fingerprinted_last_event_relayed_as_is(backend):
+    """A fingerprinted event cut off without its blank line is not given a second fingerprint."""
+    backend.handler = lambda request: _sse_response(
+        b'data: {"id": "x", "choices": []}\n\n',
+        b'data: {"id": "x", "system_fingerprint": "b1"}\n',
+    )
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1", "stream": True})
+
+    assert response.content.endswith(b'\n\ndata: {"id": "x", "system_fingerprint": "b1"}\n\n\n')
+    assert response.content.count(b'"system_fingerprint"') == 2
+
+
+def test_full_response_with_fingerprint_passed_through(backend):
+    """A runner reply that already has a fingerprint reaches the client byte for byte."""
+    body = b'{"id": "x",  "system_fingerprint": "b1", "choices": []}'
+    backend.handler = lambda request: httpx.Response(200, headers={"content-type": "application/json"}, content=body)
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1"})
+
+    assert response.status_code == 200
+    assert response.content == body
+
+
+def test_full_response_with_nested_fingerprint_key_gets_one(backend):
+    """A nested system_fingerprint key does not stop the proxy from adding the top-level one."""
+    body = b'{"id": "x", "choices": [{"message": {"tool_calls": [{"system_fingerprint": "b1"}]}}]}'
+    backend.handler = lambda request: httpx.Response(200, headers={"content-type": "application/json"}, content=body)
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1"})
+
+    assert response.status_code == 200
+    assert response.json()["system_fingerprint"] not in (None, "b1")
+    assert response.json()["choices"] == json.loads(body)["choices"]
+
+
+def test_full_response_to_stream_with_fingerprint_framed_as_is(backend):
+    """A non-streaming reply with a fingerprint becomes one unchanged SSE frame for a streaming client."""
+    body = b'{"id": "x",  "system_fingerprint": "b1", "choices": []}\n'
+    backend.handler = lambda request: httpx.Response(200, headers={"content-type": "application/json"}, content=body)
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1", "stream": True})
+
+    assert response.content == b"data: " + body.strip() + b"\n\ndata: [DONE]\n\n"
+
+
+def test_full_response_to_stream_with_nested_fingerprint_key_gets_one(backend):
+    """A nested system_fingerprint key in a non-streaming reply is not mistaken for the top-level one."""
+    body = b'{"id": "x", "choices": [{"message": {"system_fingerprint": "b1"}}]}'
+    backend.handler = lambda request: httpx.Response(200, headers={"content-type": "application/json"}, content=body)
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1", "stream": True})
+
+    [payload] = _sse_payloads(response.content)
+    assert payload["system_fingerprint"] not in (None, "b1")
+    assert payload["choices"] == json.loads(body)["choices"]
+
+
+def test_full_error_response_to_stream_is_not_framed_as_is(backend):
+    """An error reply is re-encoded rather than relayed as received, even when the probe matches."""
+    body = b'{"error": {"message": "bad", "system_fingerprint": "b1"},  "system_fingerprint": "b1"}'
+    backend.handler = lambda request: httpx.Response(500, headers={"content-type": "application/json"}, content=body)
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1", "stream": True})
+
+    assert response.content == b"data: " + _json_dumps(json.loads(body)) + b"\n\ndata: [DONE]\n\n"
+
+
+def test_full_response_to_stream_without_fingerprint_gets_one(backend):
+    """A non-streaming reply without a fingerprint has one added before it is framed."""
+    backend.handler = lambda request: httpx.Response(200, headers={"content-type": "application/json"}, content=b'{"id": "x"}')
+    response = TestClient(app).post("/v1/chat/completions", json={"model": "model-1", "stream": True})
+
+    payloads = _sse_payloads(response.content)
+    assert payloads[0]["id"] == "x"
+    assert payloads[0]["system_fingerprint"]
+    assert response.content.endswith(b"data: [DONE]\n\n")
+
+
+
+# Route, and the runner path it forwards to, for each proxied POST endpoint
+# that takes the client's stream flag.
+_COMPLETION_ROUTES = [
+    ("/api/v0/chat/completions", "/v1/chat/completions"),
+    ("/api/v0/completions", "/v1/completions"),
+    ("/v1/chat/completions", "/v1/chat/completions"),
+    ("/v1/completions", "/v1/completions"),
+]
+
+
+@pytest.mark.parametrize("route, runner_path", _COMPLETION_ROUTES)
+def test_route_forwards_non_streaming_request(backend, route, runner_path):
+    """A non-streaming request reaches the runner path unchanged and the reply gets a fingerprint."""
+    backend.handler = lambda request: httpx.Response(200, json={"id": "x", "choices": []})
+    body = b'{"model": "model-1", "messages": [{"role": "user", "content": "hi"}]}'
+    response = TestClient(app).post(route, content=body, headers={"content-type": "application/json"})
+
+    assert response.status_code == 200
+    assert response.json()["id"] == "x"
+    assert response.json()["system_fingerprint"]
+    [forwarded] = backend.requests
+    assert str(forwarded.url) == "http://127.0.0.1:8080" + runner_path
+    assert forwarded.method == "POST"
+    assert forwarded.content == body
+
+
+@pytest.mark.parametrize("route, runner_path", _COMPLETION_ROUTES)
+def test_route_forwards_streaming_request(backend, route, runner_path):
+    """A streaming request reaches the runner path and its events are relayed with a fingerprint."""
+    backend.handler = lambda request: _sse_response(b'data: {"id": "x", "choices": []}\n\n', b'data: [DONE]\n\n')
+    response = TestClient(app).post(route, json={"model": "model-1", "stream": True})
+
+    assert response.status_code == 200
+    [payload] = _sse_payloads(response.content)
+    assert payload["id"] == "x"
+    assert payload["system_fingerprint"]
+    assert response.content.endswith(b"data: [DONE]\n\n")
+    [forwarded] = backend.requests
+    assert str(forwarded.url) == "http://127.0.0.1:8080" + runner_path
+    assert json.loads(forwarded.content) == {"model": "model-1", "stream": True}
+
+
+def test_v1_embeddings_list_reply_becomes_indexed_list(backend):
+    """A list-shaped runner reply becomes an OpenAI embeddings list, one indexed object per vector."""
+    backend.handler = lambda request: httpx.Response(200, json=[{"index": 0, "embedding": [[0.1, 0.2], [0.3, 0.4]]}])
+    response = TestClient(app).post("/v1/embeddings", json={"model": "model-1", "input": ["a", "b"]})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": 0, "embedding": [0.1, 0.2]},
+            {"object": "embedding", "index": 1, "embedding": [0.3, 0.4]},
+        ],
+        "model": "model-1",
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+    [forwarded] = backend.requests
+    assert str(forwarded.url) == "http://127.0.0.1:8080/v1/embeddings"
+
+
+@pytest.mark.parametrize("route, runner_path", [("/v1/embeddings", "/v1/embeddings"), ("/api/v0/embeddings", "/embeddings")])
+def test_embeddings_routes_ignore_stream_flag(backend, route, runner_path):
+    """Embeddings are never streamed; an object reply is passed on as a JSON response."""
+    backend.handler = lambda request: httpx.Response(200, json={"object": "list", "data": []})
+    response = TestClient(app).post(route, json={"model": "model-1", "input": "a", "stream": True})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["data"] == []
+    [forwarded] = backend.requests
+    assert str(forwarded.url) == "http://127.0.0.1:8080" + runner_path
+
+
+def test_v0_embeddings_list_reply_is_an_error(backend):
+    """Only /v1/embeddings converts a list-shaped reply; /api/v0/embeddings reports it as a server error."""
+    backend.handler = lambda request: httpx.Response(200, json=[{"embedding": [[0.1]]}])
+    response = TestClient(app).post("/api/v0/embeddings", json={"model": "model-1", "input": "a"})
+
+    assert response.status_code == 500
+    assert response.json()["error"]["type"] == "internal_error"
+
+
+def _raise_connect_error(request):
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+@pytest.mark.parametrize("route", [route for route, _ in _COMPLETION_ROUTES] + ["/v1/embeddings", "/api/v0/embeddings"])
+@pytest.mark.parametrize("body, handler, status_code, error_type", [
+    (b'{"model": "model-1"', None, 400, "invalid_request_error"),
+    (b'{"model": "unknown"}', None, 400, "invalid_request_error"),
+    (b'{"model": "model-1"}', _raise_connect_error, 503, "runner_communication_error"),
+    (b'{"model": "model-1"}', lambda request: httpx.Response(200, content=b"not json"), 500, "runner_error"),
+])
+def test_route_error_status(backend, route, body, handler, status_code, error_type):
+    """Each error type reported while forwarding maps to the same status code on every route."""
+    backend.handler = handler
+    response = TestClient(app).post(route, content=body, headers={"content-type": "application/json"})
+
+    assert response.status_code == status_code
+    assert response.json()["error"]["type"] == error_type
+    assert len(backend.requests) == (0 if handler is None else 1)
+
+
+
+@pytest.fixture
+def models_state(app_state, monkeypatch):
+    """Configures one model whose running state the test controls, and counts model list renders."""
+    running = set()
+    renders = []
+    real_render = lmstudio_proxy_thread.gguf_metadata.get_all_models_lmstudio_format
+
+    def render(models_config, is_model_running_callback):
+        renders.append(models_config)
+        return real_render(models_config, is_model_running_callback)
+
+    monkeypatch.setattr(lmstudio_proxy_thread.gguf_metadata, "get_all_models_lmstudio_format", render)
+    app_state.all_models_config = {"model-1": {"model_path": MODEL_PATH}}
+    app_state.is_model_running_callback = lambda name: name in running
+    return running, renders
+
+
+def _model_states(response):
+    return {model["id"]: model["state"] for model in response.json()["data"]}
+
+
+def test_v0_models_cached_while_nothing_changes(models_state):
+    """Polling /api/v0/models within the TTL reuses the rendered list."""
+    _, renders = models_state
+    client = TestClient(app)
+    first = client.get("/api/v0/models")
+    second = client.get("/api/v0/models")
+
+    assert second.content == first.content
+    assert len(renders) == 1
+
+
+def test_v0_models_cache_follows_running_models(models_state):
+    """Starting or stopping a model re-renders the list even within the TTL."""
+    running, renders = models_state
+    client = TestClient(app)
+    assert _model_states(client.get("/api/v0/models")) == {"model-1": "not-loaded"}
+    running.add("model-1")
+    assert _model_states(client.get("/api/v0/models")) == {"model-1": "loaded"}
+    running.clear()
+    assert _model_states(client.get("/api/v0/models")) == {"model-1": "not-loaded"}
+    assert len(renders) == 3
+
+
+def test_v0_models_cache_follows_config(models_state, app_state):
+    """A reloaded config is listed even within the TTL."""
+    client = TestClient(app)
+    assert _model_states(client.get("/api/v0/models")) == {"model-1": "not-loaded"}
+    app_state.all_models_config = {"model-2": {"model_path": str(Path(__file__).parent / "model2.gguf")}}
+    assert _model_states(client.get("/api/v0/models")) == {"model-2": "not-loaded"}
+
+
+def test_v0_models_cache_expires(models_state, monkeypatch):
+    """Once the TTL has passed the list is rendered again."""
+    _, renders = models_state
+    monkeypatch.setattr(lmstudio_proxy_thread, "_MODELS_RESPONSE_TTL", 0.0)
+    client = TestClient(app)
+    client.get("/api/v0/models")
+    client.get("/api/v0/models")
+
+    assert len(renders) == 2
+
+
+def test_v1_models_cache_follows_config(models_state, app_state, monkeypatch):
+    """/v1/models reuses its body until the config is replaced; running models do not change it."""
+    running, _ = models_state
+    mappings = []
+    real_mapping = lmstudio_proxy_thread.gguf_metadata.get_model_name_to_id_mapping
+
+    def mapping(models_config):
+        mappings.append(models_config)
+        return real_mapping(models_config)
+
+    monkeypatch.setattr(lmstudio_proxy_thread.gguf_metadata, "get_model_name_to_id_mapping", mapping)
+    client = TestClient(app)
+    first = client.get("/v1/models")
+    running.add("model-1")
+    assert client.get("/v1/models").content == first.content
+    assert [model["id"] for model in first.json()["data"]] == ["model-1"]
+    assert len(mappings) == 1
+
+    app_state.all_models_config = {"model-2": {"model_path": str(Path(__file__).parent / "model2.gguf")}}
+    assert [model["id"] for model in client.get("/v1/models").json()["data"]] == ["model-2"]
+    assert len(mappings) == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("enabled", [False, True])
+async def test_prompt_log_worker_only_runs_when_enabled(app_state, monkeypatch, enabled):
+    """The proxy only starts the prompt-log writer when prompt logging is on."""
+    started = []
+    real_worker = lmstudio_proxy_thread._prompt_log_worker
+
+    def worker(queue, prompts_logger):
+        started.append(queue)
+        return real_worker(queue, prompts_logger)
+
+    async def serve(self):
+        pass
+
+    monkeypatch.setattr(lmstudio_proxy_thread, "_prompt_log_worker", worker)
+    monkeypatch.setattr(lmstudio_proxy_thread.uvicorn.Server, "serve", serve)
+    server = LMStudioProxyServer({}, {}, lambda name: False, lambda name: None, None, None, None,
+                                 prompt_logging_enabled=enabled)
+    await server.start()
+
+    assert len(started) == (1 if enabled else 0)
+    assert app_state.prompt_logging_enabled is enabled
+    assert getattr(app_state, "prompt_log_queue", None) is None
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_prompt_logging_follows_config(enabled):
+    """The logging.prompt_logging_enabled config option reaches the LM Studio proxy."""
+    hsm = HeadlessServiceManager(
+        {"proxies": {"ollama": {"enabled": False}}, "logging": {"prompt_logging_enabled": enabled}}, {}
+    )
+    assert hsm.lmstudio_proxy.prompt_logging_enabled is enabled
+
+
+def test_prompt_logging_logs_request_and_response(backend, caplog):
+    """With prompt logging on, the forwarded request and the runner's reply are logged."""
+    backend.handler = lambda request: httpx.Response(200, json={"id": "x", "choices": []})
+    app.state.prompt_logging_enabled = True
+    with caplog.at_level(logging.INFO):
+        TestClient(app).post("/v1/chat/completions", json={"model": "model-1", "messages": []})
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(m.startswith("Request to /v1/chat/completions for model 'model-1'") and '"messages"' in m for m in messages)
+    assert any(m.startswith("Response from http://127.0.0.1:8080/v1/chat/completions") and '"id"' in m for m in messages)
@@ -10,7 +10,7 @@ import os
 # Add the project root to the path so we can import llama_runner modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from llama_runner.log_parser import LlamaLogParser, ModelStatus
+from llama_runner.log_parser import LlamaLogParser, ModelStatus, ModelStatusInfo
 
 def test_log_parser():
     """Test the log parser with sample log data."""
@@ -217,8 +217,80 @@ def test_status_transitions_between_generations():
     assert ModelStatus.COMPLETED in second_gen_statuses, "Second generation should have COMPLETED status"
     assert status_history[-1] == ModelStatus.IDLE, "Final status should be IDLE"
 
+def test_task_after_timing_repeating_earlier_line():
+    """A task line after the timings counts as newer even if the same text appeared before them."""
+    logs = [
+        "srv  update_slots: processing task",
+        "prompt eval time =     100.00 ms /    10 tokens",
+        "eval time =     200.00 ms /    20 tokens",
+        "srv  update_slots: all slots are idle",
+        "srv  update_slots: processing task",
+    ]
+
+    parser = LlamaLogParser()
+    status_info = parser.parse_multiple_lines(logs)
+
+    assert status_info.status == ModelStatus.STARTING, f"Expected STARTING status, got {status_info.status}"
+
+def test_feed_matches_parse_multiple_lines():
+    """Feeding a log in pieces gives the same status as parsing it whole."""
+    logs = [
+        "srv  update_slots: all slots are idle",
+        "slot launch_slot_: id  0 | task 0 | processing task",
+        "slot update_slots: id  0 | task 0 | new prompt, n_ctx_slot = 65024, n_keep = 0, n_prompt_tokens = 33",
+        "slot update_slots: id  0 | task 0 | prompt processing progress, n_past = 33, n_tokens = 33, progress = 1.000000",
+        "slot update_slots: id  0 | task 0 | prompt done, n_past = 33, n_tokens = 33",
+        "prompt eval time =     990.30 ms /    33 tokens",
+        "eval time =   19521.92 ms /   710 tokens",
+        "total time =   20512.22 ms /   743 tokens",
+        "srv  update_slots: all slots are idle",
+        "slot launch_slot_: id  0 | task 711 | processing task",
+    ]
+
+    parser = LlamaLogParser()
+    for end in range(0, len(logs), 3):
+        status_info = parser.feed(logs[end:end + 3])
+        expected = LlamaLogParser().parse_multiple_lines(logs[:end + 3])
+        assert status_info == expected, f"After {end + 3} lines expected {expected}, got {status_info}"
+
+def test_parse_multiple_lines_resets_at_idle():
+    """Lines before the last "all slots are idle" do not affect the status."""
+    parser = LlamaLogParser()
+    logs = [
+        "slot update_slots: id  0 | task 0 | prompt processing progress, n_past = 33, n_tokens = 33, progress = 0.500000",
+        "prompt eval time =     990.30 ms /    33 tokens",
+        "srv  update_slots: all slots are idle",
+        "srv  log_server_r: request: POST /v1/chat/completions 127.0.0.1 200",
+    ]
+    assert parser.parse_multiple_lines(logs) == ModelStatusInfo(status=ModelStatus.IDLE)
+
+    logs.append("slot launch_slot_: id  0 | task 1 | processing task")
+    assert parser.parse_multiple_lines(logs) == ModelStatusInfo(status=ModelStatus.STARTING)
+
+def test_parse_multiple_lines_uses_last_timing():
+    """With several generations in the log, the speeds come from the last one."""
+    parser = LlamaLogParser()
+    logs = [
+        "prompt eval time =     100.00 ms /    10 tokens",
+        "       eval time =    1000.00 ms /    20 tokens",
+        "srv  update_slots: all slots are idle",
+        "slot launch_slot_: id  0 | task 21 | processing task",
+        "prompt eval time =     200.00 ms /    50 tokens",
+        "       eval time =    2000.00 ms /    30 tokens",
+        "srv  update_slots: all slots are idle",
+    ]
+    status_info = parser.parse_multiple_lines(logs)
+    assert status_info.status == ModelStatus.COMPLETED, f"Expected COMPLETED status, got {status_info.status}"
+    assert status_info.prompt_tokens == 50, f"Expected 50 prompt tokens, got {status_info.prompt_tokens}"
+    assert status_info.generated_tokens == 30, f"Expected 30 generated tokens, got {status_info.generated_tokens}"
+    assert status_info.processing_speed == 250.0, f"Expected 250 t/s, got {status_info.processing_speed}"
+
 if __name__ == "__main__":
     test_log_parser()
     test_timing_log_parser()
     test_status_transitions_between_generations()
-    print("All tests passed!")
\ No newline at end of file
+    test_task_after_timing_repeating_earlier_line()
+    test_feed_matches_parse_multiple_lines()
+    test_parse_multiple_lines_resets_at_idle()
+    test_parse_multiple_lines_uses_last_timing()
+    print("All tests passed!")